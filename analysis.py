@@ -0,0 +1,195 @@
+"""
+Engine searches in the background: a worker process (or thread) runs one search job
+at a time while the caller keeps handling its own events.
+
+    worker = AnalysisWorker()
+    worker.start(position)              # search until stopped
+    ...
+    for update in worker.poll():        # never blocks
+        print(update.info)
+    worker.best                         # best result of the running job so far
+    worker.stop()
+
+``ponder`` searches the position after the expected reply on the opponent's time.
+If the opponent plays that move, ``ponderhit`` turns the running search into the
+real one and gives it a time limit, otherwise ``start`` a new job. Either way the
+transposition table of the worker stays filled.
+
+    python analysis.py [seconds]
+
+analyzes the start position and reports how long the caller's loop was held up
+with the search in a thread and in a process.
+"""
+import multiprocessing
+import queue
+import sys
+import threading
+import time
+from typing import Callable, List, NamedTuple, Optional
+
+from bitboard import Position
+from engine import MAX_PLY, Engine, SearchInfo, evaluate
+
+# no deadline
+FOREVER = float("inf")
+
+
+class AnalysisUpdate(NamedTuple):
+    job: int
+    info: SearchInfo
+    final: bool     # the search of the job is over
+
+
+class _JobEngine(Engine):
+    """an engine aborted when its job is no longer the current one or the deadline passed"""
+
+    def __init__(self, current, deadline, tt_size_mb: float, evaluate: Callable[[Position], int]):
+        Engine.__init__(self, tt_size_mb, evaluate)
+        self.job = 0
+        self._current = current
+        self._shared_deadline = deadline
+
+    def _check_limits(self):
+        if self._current.value != self.job or time.time() > self._shared_deadline.value:
+            self.stopped = True
+        Engine._check_limits(self)
+
+
+def _run_jobs(jobs, results, current, deadline, tt_size_mb: float, evaluate: Callable[[Position], int]):
+    engine = _JobEngine(current, deadline, tt_size_mb, evaluate)
+    while True:
+        job = jobs.get()
+        if job is None:
+            return
+        engine.job, position, max_depth, node_limit = job
+        if current.value != engine.job:
+            continue    # stopped before it started
+
+        def info(result: SearchInfo, job: int = engine.job):
+            results.put(AnalysisUpdate(job, result, False))
+
+        result = engine.search(position, max_depth, None, node_limit, info=info)
+        results.put(AnalysisUpdate(engine.job, result, True))
+
+
+class AnalysisWorker():
+    """
+    ``Engine.search`` in a separate process, or in a thread with ``process=False``
+    (a thread shares the interpreter lock with the caller). Only the results of the
+    latest job are reported; use ``close`` or a ``with`` block to end the worker.
+    """
+
+    def __init__(self, process: bool = True, tt_size_mb: float = 16, evaluate: Callable[[Position], int] = evaluate):
+        if process:
+            context = multiprocessing.get_context()
+            self._jobs, self._results = context.Queue(), context.Queue()
+            self._current, self._deadline = context.RawValue("i", 0), context.RawValue("d", FOREVER)
+            runner = context.Process
+        else:
+            self._jobs, self._results = queue.Queue(), queue.Queue()
+            # plain ctypes values without a lock are enough for one writer
+            self._current, self._deadline = multiprocessing.RawValue("i", 0), multiprocessing.RawValue("d", FOREVER)
+            runner = threading.Thread
+        self._worker = runner(
+            target=_run_jobs, daemon=True,
+            args=(self._jobs, self._results, self._current, self._deadline, tt_size_mb, evaluate)
+        )
+        self._worker.start()
+        self.job = 0
+        self.best: Optional[SearchInfo] = None
+        self.done = True
+        self.pondering: Optional[int] = None
+
+    def start(self, position: Position, time_limit: Optional[float] = None, max_depth: int = MAX_PLY,
+              node_limit: Optional[int] = None) -> int:
+        """searches ``position`` instead of the running job, without ``time_limit`` until ``stop``"""
+        self.job += 1
+        self.best = None
+        self.done = False
+        self.pondering = None
+        self._deadline.value = FOREVER if time_limit is None else time.time() + time_limit
+        self._current.value = self.job
+        self._jobs.put((self.job, position.copy(), max_depth, node_limit))
+        return self.job
+
+    def ponder(self, position: Position, move: int) -> int:
+        """searches the position after the opponent plays ``move`` until ``ponderhit`` or ``stop``"""
+        position = position.copy()
+        position.make_move(move)
+        job = self.start(position)
+        self.pondering = move
+        return job
+
+    def ponderhit(self, move: int, time_limit: Optional[float] = None) -> bool:
+        """
+        The opponent played ``move``: if it was pondered on, the running job goes on
+        as the search of the current position with ``time_limit`` counted from now.
+        """
+        if self.pondering is None or self.pondering != move:
+            return False
+        self.pondering = None
+        if time_limit is not None:
+            self._deadline.value = time.time() + time_limit
+        return True
+
+    def stop(self):
+        """aborts the running job; its last result still comes in through ``poll``"""
+        self._current.value = 0
+
+    def poll(self, timeout: float = 0) -> List[AnalysisUpdate]:
+        """the results of the latest job that came in since the last call, waits up to ``timeout`` seconds for one"""
+        updates = []
+        while True:
+            try:
+                update = self._results.get(timeout=timeout) if timeout > 0 else self._results.get_nowait()
+            except queue.Empty:
+                return updates
+            timeout = 0
+            if update.job != self.job:
+                continue
+            if update.info.pv:
+                self.best = update.info
+            self.done = update.final
+            updates.append(update)
+
+    def wait(self, timeout: Optional[float] = None) -> Optional[SearchInfo]:
+        """blocks until the latest job is done; returns its best result"""
+        end = FOREVER if timeout is None else time.perf_counter() + timeout
+        while not self.done and time.perf_counter() < end:
+            self.poll(min(end - time.perf_counter(), 0.1))
+        return self.best
+
+    def close(self):
+        self.stop()
+        self._jobs.put(None)
+        self._worker.join()
+
+    def __enter__(self) -> "AnalysisWorker":
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 3
+    for process in (False, True):
+        with AnalysisWorker(process) as worker:
+            worker.start(Position.initial(), time_limit=seconds)
+            # a loop of the caller that wants to run every 10 ms
+            longest = 0.0
+            last = time.perf_counter()
+            while not worker.done:
+                for update in worker.poll():
+                    print("  ", update.info)
+                time.sleep(0.01)
+                now = time.perf_counter()
+                longest = max(longest, now - last - 0.01)
+                last = now
+        print("%s: best %s, caller held up for up to %.1f ms" % (
+            "process" if process else "thread", worker.best, 1000 * longest
+        ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+from typing import List, Optional
+
+from bitboard import EMPTY, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, SQUARES, Position, bits
+from attacks import (
+    ALL_DIRECTIONS, RAY_MASKS, KNIGHT_ATTACKS, KING_ATTACKS, PAWN_ATTACKS,
+    first_blocker, rook_attacks, bishop_attacks, queen_attacks
+)
+
+
+class AttackMap():
+    """
+    The squares attacked by every piece of a position, kept up to date while moves
+    are made and taken back.
+
+    After a move only the pieces on the changed squares and the sliders looking at
+    those squares attack differently. ``refresh`` recomputes exactly these, which is
+    the same for ``make_move`` and ``unmake_move``.
+    """
+    __slots__ = ("position", "attacks_from", "_attacked")
+
+    def __init__(self, position: Position):
+        self.position = position
+        self.attacks_from: List[int] = [0] * SQUARES
+        self._attacked: List[Optional[int]] = [None, None]
+        for sq in bits(position.occupied):
+            self.attacks_from[sq] = self._attacks_of(sq)
+
+    def _attacks_of(self, sq: int) -> int:
+        p = self.position.mailbox[sq]
+        if p == EMPTY:
+            return 0
+        kind = p % 6
+        if kind == PAWN:
+            return PAWN_ATTACKS[sq]
+        elif kind == KNIGHT:
+            return KNIGHT_ATTACKS[sq]
+        elif kind == KING:
+            return KING_ATTACKS[sq]
+        elif kind == BISHOP:
+            return bishop_attacks(sq, self.position.occupied)
+        elif kind == ROOK:
+            return rook_attacks(sq, self.position.occupied)
+        return queen_attacks(sq, self.position.occupied)
+
+    def refresh(self, *squares: int):
+        """call after the pieces on ``squares`` changed, e.g. the start and target of a move"""
+        position = self.position
+        occupied = position.occupied
+        mailbox = position.mailbox
+        update = 0
+        for sq in squares:
+            update |= 1 << sq
+            for d in ALL_DIRECTIONS:
+                blockers = RAY_MASKS[d][sq] & occupied
+                if not blockers:
+                    continue
+                b = first_blocker(d, sq, blockers)
+                kind = mailbox[b] % 6
+                if kind == QUEEN or kind == (ROOK if d < 4 else BISHOP):
+                    update |= 1 << b
+
+        attacks_from = self.attacks_from
+        for sq in bits(update):
+            attacks_from[sq] = self._attacks_of(sq)
+        self._attacked = [None, None]
+
+    def make_move(self, move: int):
+        self.position.make_move(move)
+        self.refresh(move & 0xFF, move >> 8 & 0xFF)
+
+    def unmake_move(self) -> int:
+        move = self.position.unmake_move()
+        self.refresh(move & 0xFF, move >> 8 & 0xFF)
+        return move
+
+    def attacked(self, color: int) -> int:
+        """all squares attacked by the pieces of ``color``"""
+        attacked = self._attacked[color]
+        if attacked is None:
+            attacked = 0
+            attacks_from = self.attacks_from
+            for sq in bits(self.position.colors[color]):
+                attacked |= attacks_from[sq]
+            self._attacked[color] = attacked
+        return attacked
+
+    def is_attacked(self, sq: int, by: int) -> bool:
+        return bool(self.attacked(by) >> sq & 1)
+
+    def attackers(self, sq: int, by: int) -> int:
+        """the squares of the pieces of ``by`` attacking ``sq``"""
+        attackers = 0
+        attacks_from = self.attacks_from
+        for origin in bits(self.position.colors[by]):
+            if attacks_from[origin] >> sq & 1:
+                attackers |= 1 << origin
+        return attackers
+
+    def in_check(self, color: int) -> bool:
+        return self.is_attacked(self.position.king_square(color), 1 - color)
+
+    def checkers(self, color: int) -> int:
+        """the squares of the pieces giving check to the king of ``color``"""
+        return self.attackers(self.position.king_square(color), 1 - color)
@@ -0,0 +1,162 @@
+"""
+Attack and ray tables of the circular board, computed once at import time.
+
+Files wrap around (file 23 is next to file 0), ranks do not. Rays end in front of
+the missing tiles on rank 7 and never return to the square they started from.
+"""
+from typing import Dict, List, Tuple
+
+from bitboard import TOTAL_FILES, RANKS, SQUARES, does_tile_exist, square, tile
+
+# (file step, rank step)
+DIRECTIONS = (
+    (1, 0), (-1, 0), (0, 1), (0, -1),       # orthogonal
+    (1, 1), (1, -1), (-1, 1), (-1, -1),     # diagonal
+)
+ORTHOGONAL = (0, 1, 2, 3)
+DIAGONAL = (4, 5, 6, 7)
+ALL_DIRECTIONS = ORTHOGONAL + DIAGONAL
+
+KNIGHT_STEPS = ((1, 2), (2, 1), (2, -1), (1, -2), (-1, -2), (-2, -1), (-2, 1), (-1, 2))
+KING_STEPS = DIRECTIONS
+
+# how the first piece on a ray is found, see first_blocker
+_LOWEST, _HIGHEST, _RING_UP, _RING_DOWN = range(4)
+
+
+def _step(sq: int, df: int, dr: int) -> int:
+    """the square reached by a single step or -1 if there is no tile"""
+    file, rank = tile(sq)
+    file = (file + df) % TOTAL_FILES
+    rank += dr
+    if not 0 <= rank < RANKS or not does_tile_exist(file, rank):
+        return -1
+    return square(file, rank)
+
+
+def _ray(sq: int, df: int, dr: int) -> Tuple[int, ...]:
+    ray = []
+    current = _step(sq, df, dr)
+    while current != -1 and current != sq:
+        ray.append(current)
+        current = _step(current, df, dr)
+    return tuple(ray)
+
+
+def _mask(squares) -> int:
+    mask = 0
+    for sq in squares:
+        mask |= 1 << sq
+    return mask
+
+
+def _leaper_table(steps) -> List[int]:
+    table = [0] * SQUARES
+    for sq in range(SQUARES):
+        if does_tile_exist(*tile(sq)):
+            table[sq] = _mask(t for t in (_step(sq, df, dr) for df, dr in steps) if t != -1)
+    return table
+
+
+# RAYS[d][sq] are the squares in direction d ordered by distance
+RAYS: List[List[Tuple[int, ...]]] = []
+RAY_MASKS: List[List[int]] = []
+# RAY_PREFIX[d][sq][i] is the mask of RAYS[d][sq][:i + 1]
+RAY_PREFIX: List[List[Tuple[int, ...]]] = []
+# RAY_INDEX[d][sq][target] is the position of target in RAYS[d][sq]
+RAY_INDEX: List[List[Dict[int, int]]] = []
+
+for _df, _dr in DIRECTIONS:
+    _rays = [_ray(sq, _df, _dr) if does_tile_exist(*tile(sq)) else () for sq in range(SQUARES)]
+    RAYS.append(_rays)
+    RAY_MASKS.append([_mask(ray) for ray in _rays])
+    _prefixes = []
+    for ray in _rays:
+        prefix = []
+        mask = 0
+        for sq in ray:
+            mask |= 1 << sq
+            prefix.append(mask)
+        _prefixes.append(tuple(prefix))
+    RAY_PREFIX.append(_prefixes)
+    RAY_INDEX.append([{sq: i for i, sq in enumerate(ray)} for ray in _rays])
+
+_BLOCKER_SEARCH = tuple(
+    _LOWEST if dr > 0 else _HIGHEST if dr < 0 else _RING_UP if df > 0 else _RING_DOWN
+    for df, dr in DIRECTIONS
+)
+
+KNIGHT_ATTACKS = _leaper_table(KNIGHT_STEPS)
+KING_ATTACKS = _leaper_table(KING_STEPS)
+# both colors move their pawns towards the center of the board
+PAWN_ATTACKS = _leaper_table(((1, -1), (-1, -1)))
+# squares from which a pawn attacks the square
+PAWN_ATTACKERS = _leaper_table(((1, 1), (-1, 1)))
+PAWN_PUSHES = [_step(sq, 0, -1) if does_tile_exist(*tile(sq)) else -1 for sq in range(SQUARES)]
+
+del _df, _dr, _rays, _prefixes
+
+
+def first_blocker(d: int, sq: int, blockers: int) -> int:
+    """
+    The square of the nearest blocker on the ray ``d`` starting at ``sq``.
+    ``blockers`` must be a non empty subset of ``RAY_MASKS[d][sq]``.
+
+    Rays changing the rank are strictly monotonic in the square index. Rays along a
+    rank run upwards (or downwards) from ``sq`` and continue at the start (or end)
+    of the rank after wrapping around.
+    """
+    search = _BLOCKER_SEARCH[d]
+    if search == _LOWEST:
+        return (blockers & -blockers).bit_length() - 1
+    elif search == _HIGHEST:
+        return blockers.bit_length() - 1
+    elif search == _RING_UP:
+        above = blockers >> (sq + 1) << (sq + 1)
+        if above:
+            blockers = above
+        return (blockers & -blockers).bit_length() - 1
+    below = blockers & ((1 << sq) - 1)
+    if below:
+        blockers = below
+    return blockers.bit_length() - 1
+
+
+def ray_attacks(d: int, sq: int, occupied: int) -> int:
+    """squares attacked along one ray including the first blocker"""
+    mask = RAY_MASKS[d][sq]
+    blockers = mask & occupied
+    if not blockers:
+        return mask
+    return RAY_PREFIX[d][sq][RAY_INDEX[d][sq][first_blocker(d, sq, blockers)]]
+
+
+def slider_attacks(sq: int, occupied: int, directions) -> int:
+    attacks = 0
+    for d in directions:
+        attacks |= ray_attacks(d, sq, occupied)
+    return attacks
+
+
+def rook_attacks(sq: int, occupied: int) -> int:
+    return slider_attacks(sq, occupied, ORTHOGONAL)
+
+
+def bishop_attacks(sq: int, occupied: int) -> int:
+    return slider_attacks(sq, occupied, DIAGONAL)
+
+
+def queen_attacks(sq: int, occupied: int) -> int:
+    return slider_attacks(sq, occupied, ALL_DIRECTIONS)
+
+
+def slide_path(start: int, target: int, directions, occupied: int) -> Tuple[int, ...]:
+    """
+    The squares a slider passes when moving from ``start`` to ``target``, ending with
+    ``target``. Empty if no ray in ``directions`` reaches ``target`` unblocked.
+    """
+    for d in directions:
+        index = RAY_INDEX[d][start].get(target)
+        if index is not None and not RAY_PREFIX[d][start][index] & ~(1 << target) & occupied:
+            return RAYS[d][start][:index + 1]
+    return ()
@@ -0,0 +1,116 @@
+"""
+Benchmarks of the rules, the rendering and the coordinate conversions.
+
+    python -m benchmarks [NAME ...] [--repeat N] [--json FILE] [--baseline FILE] [--threshold 0.1]
+
+runs the benchmarks whose names contain one of ``NAME`` (all without), prints the
+microseconds per operation and writes them as JSON. With ``--baseline`` every
+benchmark slower than the baseline by more than ``--threshold`` (a fraction) is a
+regression and the exit status is 1. The median of a run is compared with the
+slowest repeat of the baseline, so only slowdowns beyond the noise of the baseline
+count; best times are too easily lucky.
+
+Timings only compare on the same machine, so no baseline is kept in the repository.
+Write one with ``--json`` on the machine that runs the comparison, from the commit
+to compare with:
+
+    python -m benchmarks --json baseline.json
+    ... change the code ...
+    python -m benchmarks --baseline baseline.json
+
+A benchmark is a function registered with ``@benchmark`` that prepares its data
+and returns the function to time; that one returns the number of operations it did.
+"""
+import importlib
+import os
+import platform
+import statistics
+import sys
+import time
+from typing import Callable, Dict, List, NamedTuple
+
+# rendering runs without a window
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+Setup = Callable[[], Callable[[], int]]
+
+BENCHMARKS: Dict[str, Setup] = {}
+# the modules of this package that register benchmarks, see ``load``
+MODULES = ("rules", "rendering", "coordinates")
+# timed runs of every benchmark, enough for a stable median
+REPEAT = 15
+
+
+def benchmark(setup: Setup) -> Setup:
+    """registers ``setup`` as ``<module>.<function name>``"""
+    BENCHMARKS["%s.%s" % (setup.__module__.rsplit(".", 1)[-1], setup.__name__)] = setup
+    return setup
+
+
+class Measurement(NamedTuple):
+    us_per_op: float    # the best of all repeats
+    median_us: float
+    max_us: float       # the slowest repeat
+    ops: int
+
+
+class Comparison(NamedTuple):
+    name: str
+    baseline_us: float
+    us: float
+
+    @property
+    def ratio(self) -> float:
+        return self.us / self.baseline_us
+
+
+def load():
+    for module in MODULES:
+        importlib.import_module("%s.%s" % (__name__, module))
+
+
+def measure(setup: Setup, repeat: int = REPEAT) -> Measurement:
+    run = setup()
+    run()    # warm up caches
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        ops = run()
+        if not ops:
+            raise ValueError("%s did no operations" % getattr(setup, "__name__", setup))
+        times.append((time.perf_counter() - start) / ops * 1e6)
+    return Measurement(min(times), statistics.median(times), max(times), ops)
+
+
+def run_all(names: List[str], repeat: int = REPEAT, report: Callable[[str, Measurement], None] = lambda *_: None) -> Dict[str, Measurement]:
+    results = {}
+    for name, setup in BENCHMARKS.items():
+        if names and not any(part in name for part in names):
+            continue
+        results[name] = measure(setup, repeat)
+        report(name, results[name])
+    return results
+
+
+def to_json(results: Dict[str, Measurement]) -> dict:
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "benchmarks": {name: measurement._asdict() for name, measurement in results.items()},
+    }
+
+
+def compare(results: Dict[str, Measurement], baseline: dict) -> List[Comparison]:
+    """
+    The benchmarks in both, ``baseline`` as written by ``to_json``: the median of
+    ``results`` against the slowest repeat of the baseline.
+    """
+    old = baseline["benchmarks"]
+    return [
+        Comparison(name, old[name]["max_us"], measurement.median_us)
+        for name, measurement in results.items() if name in old
+    ]
+
+
+def python_info() -> str:
+    return "%s %s" % (platform.python_implementation(), sys.version.split()[0])
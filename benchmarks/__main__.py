@@ -0,0 +1,58 @@
+import argparse
+import json
+import sys
+
+from benchmarks import BENCHMARKS, REPEAT, Measurement, compare, load, python_info, run_all, to_json
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="measures the hot paths of the game")
+    parser.add_argument("names", nargs="*", help="run only benchmarks whose names contain one of these")
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    parser.add_argument("--json", help="file the results are written to")
+    parser.add_argument("--baseline", help="results of an earlier run to compare with")
+    parser.add_argument("--threshold", type=float, default=0.1, help="allowed slowdown of the median over the slowest baseline run as a fraction, 0.1 is 10%%")
+    parser.add_argument("--list", action="store_true", help="only print the names")
+    args = parser.parse_args()
+
+    load()
+    if args.list:
+        print("\n".join(BENCHMARKS))
+        return
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+
+    def report(name: str, measurement: Measurement):
+        print("%-32s %12.2f us/op %12.2f median %12.2f max %8i ops" % (
+            name, measurement.us_per_op, measurement.median_us, measurement.max_us, measurement.ops
+        ))
+
+    print(python_info())
+    results = run_all(args.names, args.repeat, report)
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(to_json(results), file, indent=2)
+            file.write("\n")
+
+    if baseline is None:
+        return
+    regressions = 0
+    print("\ncompared with %s (threshold %+.0f%%):" % (args.baseline, 100 * args.threshold))
+    for comparison in compare(results, baseline):
+        regression = comparison.ratio > 1 + args.threshold
+        regressions += regression
+        print("%-32s %12.2f (max) -> %10.2f (median) us/op %+7.1f%%%s" % (
+            comparison.name, comparison.baseline_us, comparison.us, 100 * (comparison.ratio - 1),
+            "  REGRESSION" if regression else ""
+        ))
+    if regressions:
+        print("%i regression(s)" % regressions)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
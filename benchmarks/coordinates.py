@@ -0,0 +1,65 @@
+"""conversions of ``PolarCoordinate`` and ``PolarArray``"""
+import numpy as np
+import pygame
+
+from benchmarks import benchmark
+from polar_coordinate import PolarArray, PolarCoordinate
+
+# pixels of a 800 x 600 window relative to its center, every 7th one
+SIZE = (800, 600)
+
+
+def _pixels():
+    width, height = SIZE
+    x, y = np.meshgrid(np.arange(0, width, 7) - width // 2, np.arange(0, height, 7) - height // 2)
+    return x.ravel(), y.ravel()
+
+
+def _check_same(x: np.ndarray, y: np.ndarray, screen: pygame.Surface):
+    """``PolarArray`` has to give the results of ``PolarCoordinate``, or it is not the same code path"""
+    array = PolarArray.from_cartesian(x, y)
+    xs, ys = array.to_cartesian(screen)
+    for i in range(0, len(x), 97):
+        single = PolarCoordinate.from_cartesian(int(x[i]), int(y[i]))
+        if not np.allclose((single.r, single.phi, *single.to_cartesian(screen)), (array.r[i], array.phi[i], xs[i], ys[i]), rtol=1e-12, atol=1e-9):
+            raise AssertionError("PolarArray differs from PolarCoordinate at (%i, %i)" % (x[i], y[i]))
+
+
+@benchmark
+def polar_scalar():
+    """``PolarCoordinate.from_cartesian`` and ``to_cartesian`` one pixel at a time"""
+    x, y = _pixels()
+    points = list(zip(x.tolist(), y.tolist()))
+    screen = pygame.Surface(SIZE)
+
+    def run() -> int:
+        for px, py in points:
+            PolarCoordinate.from_cartesian(px, py).to_cartesian(screen)
+        return len(points)
+    return run
+
+
+@benchmark
+def polar_bulk():
+    """the same conversions with ``PolarArray``, per pixel"""
+    x, y = _pixels()
+    screen = pygame.Surface(SIZE)
+    _check_same(x, y, screen)
+
+    def run() -> int:
+        PolarArray.from_cartesian(x, y).to_cartesian(screen)
+        return len(x)
+    return run
+
+
+@benchmark
+def polar_tiles():
+    """``PolarArray.to_tiles`` and ``from_tiles`` per pixel"""
+    x, y = _pixels()
+    array = PolarArray.from_cartesian(x, y)
+
+    def run() -> int:
+        files, ranks = array.to_tiles(30.0, 100)
+        PolarArray.from_tiles(files, ranks, 30.0, 100)
+        return len(x)
+    return run
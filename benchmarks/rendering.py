@@ -0,0 +1,71 @@
+"""frames of ``main`` drawn offscreen, see ``SDL_VIDEODRIVER`` in ``benchmarks``"""
+import pygame
+
+import main
+from benchmarks import benchmark
+from benchmarks.rules import midgame_boards
+
+SIZE = (800, 600)
+
+
+def _screen() -> pygame.Surface:
+    pygame.display.init()
+    pygame.font.init()
+    return pygame.display.set_mode(SIZE)
+
+
+@benchmark
+def full_frame():
+    """``draw_board`` and ``draw_pieces`` of midgame positions with highlights, the board cached"""
+    screen = _screen()
+    boards = midgame_boards(10)
+
+    def run() -> int:
+        for board in boards:
+            main.draw_board(screen, (3, 4), (5, 5), check_field=board.checked, hints=((6, 6), (6, 4)), pv=((7, 6), (7, 4)))
+            main.draw_pieces(screen, board)
+        return len(boards)
+    return run
+
+
+@benchmark
+def dirty_tiles():
+    """the redraw of two tiles when the mouse moves to the next tile"""
+    screen = _screen()
+    board = midgame_boards(1)[0]
+    tiles = [(file, 3) for file in range(main.TOTAL_FILES)]
+
+    def run() -> int:
+        for old, new in zip(tiles, tiles[1:]):
+            rects = [main.tile_rect(screen, tile) for tile in (old, new)]
+            for rect in rects:
+                screen.set_clip(rect)
+                main.draw_board(screen, new, None, check_field=board.checked)
+                main.draw_pieces(screen, board)
+            screen.set_clip(None)
+        return len(tiles) - 1
+    return run
+
+
+@benchmark
+def board_background():
+    """the board without pieces, rendered when the window size changes"""
+    screen = _screen()
+
+    def run() -> int:
+        main.invalidate_board_cache()
+        main.board_background(screen)
+        return 1
+    return run
+
+
+@benchmark
+def hit_test_map():
+    """the tile under every pixel, computed when the window size changes"""
+    screen = _screen()
+
+    def run() -> int:
+        main._hit_test_cache.clear()
+        main.hit_test_map(screen)
+        return 1
+    return run
@@ -0,0 +1,116 @@
+"""move validation, move paths and check detection of ``circle_chess``"""
+import random
+from typing import List, Tuple
+
+from benchmarks import benchmark
+from bitboard import RANKS, TOTAL_FILES, Position, does_tile_exist, move_start, move_target, tile
+from circle_chess import ChesssBoard
+from movegen import generate_legal_moves
+
+GAMES = 20
+PLIES = 60
+EXISTING_TILES = [(file, rank) for rank in range(RANKS) for file in range(TOTAL_FILES) if does_tile_exist(file, rank)]
+
+
+def scripted_games(count: int = GAMES, plies: int = PLIES, seed: int = 0) -> List[List[int]]:
+    """random games, the same in every run"""
+    rng = random.Random(seed)
+    games = []
+    for _ in range(count):
+        position = Position.initial()
+        moves = []
+        for _ in range(plies):
+            legal = generate_legal_moves(position)
+            if not legal:
+                break
+            move = rng.choice(legal)
+            position.make_move(move)
+            moves.append(move)
+        games.append(moves)
+    return games
+
+
+def midgame_boards(count: int = 50, plies: int = 24, min_pieces: int = 28, seed: int = 1) -> List[ChesssBoard]:
+    """boards after ``plies`` random moves with at least ``min_pieces`` pieces left"""
+    boards = []
+    for moves in scripted_games(count * 4, plies, seed):
+        board = ChesssBoard()
+        for move in moves:
+            board.make_move(move)
+        if len(moves) == plies and bin(board.position.occupied).count("1") >= min_pieces:
+            boards.append(board)
+            if len(boards) == count:
+                break
+    return boards
+
+
+@benchmark
+def move_piece():
+    """``ChesssBoard.move_piece`` for every move of the scripted games, each after a rejected move"""
+    rng = random.Random(2)
+    games: List[List[Tuple[Tuple[int, int], Tuple[int, int], Tuple[int, int]]]] = []
+    for moves in scripted_games():
+        position = Position.initial()
+        script = []
+        for move in moves:
+            legal = {tile(move_target(other)) for other in generate_legal_moves(position) if move_start(other) == move_start(move)}
+            legal.add(tile(move_start(move)))
+            illegal = rng.choice([target for target in EXISTING_TILES if target not in legal])
+            script.append((tile(move_start(move)), tile(move_target(move)), illegal))
+            position.make_move(move)
+        games.append(script)
+
+    def run() -> int:
+        ops = 0
+        for script in games:
+            board = ChesssBoard()
+            for start, target, illegal in script:
+                board.move_piece(start, illegal)
+                board.move_piece(start, target)
+                ops += 2
+        return ops
+    return run
+
+
+@benchmark
+def move_path():
+    """``Figure.move_path`` of every piece to every tile in midgame positions"""
+    setups = []
+    for board in midgame_boards(10):
+        player = board.get_player()
+        own, opponents = (board.white_pieces, board.black_pieces) if player == 0 else (board.black_pieces, board.white_pieces)
+        setups.append((own, opponents))
+
+    def run() -> int:
+        ops = 0
+        for own, opponents in setups:
+            for figure in own:
+                for target in EXISTING_TILES:
+                    figure.move_path(target, opponents, own)
+                ops += len(EXISTING_TILES)
+        return ops
+    return run
+
+
+@benchmark
+def check_checkmate():
+    """check, mate and repetition detection of ``ChesssBoard.check_checkmate`` in dense midgame positions"""
+    boards = midgame_boards()
+
+    def run() -> int:
+        for board in boards:
+            board.check_checkmate()
+        return len(boards)
+    return run
+
+
+@benchmark
+def legal_moves():
+    """all legal moves of midgame positions, as ``move_piece`` searches them"""
+    boards = midgame_boards()
+
+    def run() -> int:
+        for board in boards:
+            list(board.generate_legal_moves())
+        return len(boards)
+    return run
@@ -0,0 +1,310 @@
+import random
+from typing import Dict, Iterator, List, Optional, Tuple
+
+FILES = 12
+TOTAL_FILES = 2 * FILES
+RANKS = 8
+SQUARES = TOTAL_FILES * RANKS
+
+WHITE = 0
+BLACK = 1
+
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(6)
+EMPTY = -1
+
+# white pieces use lower case labels, black pieces upper case (same as the images)
+LABELS = "pnbrqkPNBRQK"
+
+
+def does_tile_exist(file: int, rank: int) -> bool:
+    if not 0 <= file < TOTAL_FILES or not 0 <= rank < RANKS:
+        return False
+    return rank != RANKS - 1 or file % FILES not in (0, 1, FILES - 2, FILES - 1)
+
+
+def square(file: int, rank: int) -> int:
+    return rank * TOTAL_FILES + file
+
+
+def tile(sq: int) -> Tuple[int, int]:
+    return sq % TOTAL_FILES, sq // TOTAL_FILES
+
+
+# a move is packed into an int: start square, target square and flags
+PROMOTION = 1 << 16
+
+
+def encode_move(start: int, target: int, promotion: bool = False) -> int:
+    return start | target << 8 | (PROMOTION if promotion else 0)
+
+
+def move_start(move: int) -> int:
+    return move & 0xFF
+
+
+def move_target(move: int) -> int:
+    return move >> 8 & 0xFF
+
+
+def piece(color: int, kind: int) -> int:
+    return color * 6 + kind
+
+
+def piece_color(p: int) -> int:
+    return p // 6
+
+
+def piece_kind(p: int) -> int:
+    return p % 6
+
+
+def bits(bb: int) -> Iterator[int]:
+    """yields the square index of every set bit"""
+    while bb:
+        low = bb & -bb
+        yield low.bit_length() - 1
+        bb ^= low
+
+
+EXISTING = 0
+for _sq in range(SQUARES):
+    if does_tile_exist(*tile(_sq)):
+        EXISTING |= 1 << _sq
+del _sq
+
+# zobrist keys; the seed is fixed so that keys stored on disk stay valid
+_random = random.Random(0x43697263)
+PIECE_KEYS = [[_random.getrandbits(64) for _ in range(SQUARES)] for _ in range(12)]
+# only the moved flags of kings and rooks matter (castling)
+UNMOVED_KEYS = [_random.getrandbits(64) for _ in range(SQUARES)]
+SIDE_KEY = _random.getrandbits(64)
+del _random
+
+_CASTLING_PIECE = tuple(p % 6 in (ROOK, KING) for p in range(12)) + (False,)    # indexed by EMPTY as well
+
+START_POSITION = (
+    (WHITE, 14, (ROOK, KNIGHT, BISHOP, QUEEN, KING, BISHOP, KNIGHT, ROOK)),
+    (BLACK, 2, (ROOK, KNIGHT, BISHOP, KING, QUEEN, BISHOP, KNIGHT, ROOK)),
+)
+
+
+class Position():
+    """
+    Bitboard representation of the circular board.
+
+    Every square ``rank * TOTAL_FILES + file`` is one bit of an integer. There is one
+    bitboard per piece (see ``piece``), one per color and one for all occupied squares.
+    ``mailbox`` maps each square to the piece standing on it or ``EMPTY``.
+
+    ``key`` is the zobrist hash of the position; ``put`` and ``remove`` don't update it,
+    call ``compute_key`` after setting up a position by hand.
+    """
+    __slots__ = (
+        "pieces", "colors", "occupied", "mailbox", "unmoved", "turn", "move_count", "history",
+        "key", "keys", "seen"
+    )
+
+    def __init__(self):
+        self.pieces: List[int] = [0] * 12
+        self.colors: List[int] = [0, 0]
+        self.occupied = 0
+        self.mailbox: List[int] = [EMPTY] * SQUARES
+        self.unmoved = 0    # squares of pieces which have not moved yet; needed for castling
+        self.turn = WHITE
+        self.move_count = 0
+        self.history: List[int] = []    # undo records of make_move
+        self.key = 0
+        self.keys: List[int] = []       # keys before each move of history
+        self.seen: Dict[int, int] = {}  # how often each key occurred; repetition detection
+
+    @classmethod
+    def initial(cls) -> "Position":
+        position = cls()
+        for color, start_file, back_rank in START_POSITION:
+            for i, kind in enumerate(back_rank):
+                position.put(piece(color, kind), square(start_file + i, RANKS - 1))
+                position.put(piece(color, PAWN), square(start_file + i, RANKS - 2))
+        position.unmoved = position.occupied
+        position.compute_key()
+        return position
+
+    def copy(self) -> "Position":
+        other = Position.__new__(Position)
+        other.pieces = self.pieces[:]
+        other.colors = self.colors[:]
+        other.occupied = self.occupied
+        other.mailbox = self.mailbox[:]
+        other.unmoved = self.unmoved
+        other.turn = self.turn
+        other.move_count = self.move_count
+        other.history = self.history[:]
+        other.key = self.key
+        other.keys = self.keys[:]
+        other.seen = self.seen.copy()
+        return other
+
+    def __getstate__(self):
+        """compact pickle: the bitboards are rebuilt from the mailbox"""
+        return bytes(p + 1 for p in self.mailbox), self.unmoved, self.turn, self.move_count, self.history, self.keys, self.key
+
+    def __setstate__(self, state):
+        mailbox, unmoved, turn, move_count, history, keys, key = state
+        self.__init__()
+        for sq, p in enumerate(mailbox):
+            if p:
+                self.put(p - 1, sq)
+        self.unmoved = unmoved
+        self.turn = turn
+        self.move_count = move_count
+        self.history = history
+        self.keys = keys
+        self.key = key
+        for k in keys + [key]:
+            self.seen[k] = self.seen.get(k, 0) + 1
+
+    def compute_key(self):
+        """recomputes ``key`` from scratch and restarts the repetition bookkeeping"""
+        key = SIDE_KEY if self.turn else 0
+        for sq in bits(self.occupied):
+            p = self.mailbox[sq]
+            key ^= PIECE_KEYS[p][sq]
+            if self.unmoved >> sq & 1 and _CASTLING_PIECE[p]:
+                key ^= UNMOVED_KEYS[sq]
+        self.key = key
+        self.keys = []
+        self.seen = {key: 1}
+
+    def repetitions(self) -> int:
+        """how often the current position occurred, counting itself"""
+        return self.seen.get(self.key, 0)
+
+    def put(self, p: int, sq: int):
+        bit = 1 << sq
+        self.pieces[p] |= bit
+        self.colors[p // 6] |= bit
+        self.occupied |= bit
+        self.mailbox[sq] = p
+
+    def remove(self, sq: int) -> int:
+        p = self.mailbox[sq]
+        if p == EMPTY:
+            return EMPTY
+        mask = ~(1 << sq)
+        self.pieces[p] &= mask
+        self.colors[p // 6] &= mask
+        self.occupied &= mask
+        self.mailbox[sq] = EMPTY
+        return p
+
+    def piece_at(self, sq: int) -> int:
+        return self.mailbox[sq]
+
+    def is_empty(self, sq: int) -> bool:
+        return not self.occupied >> sq & 1
+
+    def color_at(self, sq: int) -> Optional[int]:
+        if self.colors[WHITE] >> sq & 1:
+            return WHITE
+        if self.colors[BLACK] >> sq & 1:
+            return BLACK
+        return None
+
+    def has_moved(self, sq: int) -> bool:
+        return not self.unmoved >> sq & 1
+
+    def king_square(self, color: int) -> int:
+        return self.pieces[piece(color, KING)].bit_length() - 1
+
+    def make_move(self, move: int):
+        """
+        Plays a (legal) move and remembers how to take it back with ``unmake_move``.
+        Pawns reaching rank 0 are promoted to queens.
+
+        The undo record is a single int: the move, the captured piece and whether the
+        start and target square were still unmoved.
+        """
+        start = move & 0xFF
+        target = move >> 8 & 0xFF
+        start_bit = 1 << start
+        target_bit = 1 << target
+        mailbox = self.mailbox
+        pieces = self.pieces
+        colors = self.colors
+        p = mailbox[start]
+        captured = mailbox[target]
+        unmoved = self.unmoved
+        self.history.append(
+            move | (captured + 1) << 17 | bool(unmoved & start_bit) << 21 | bool(unmoved & target_bit) << 22
+        )
+        key = self.key
+        self.keys.append(key)
+        key ^= SIDE_KEY ^ PIECE_KEYS[p][start]
+        if unmoved & start_bit and _CASTLING_PIECE[p]:
+            key ^= UNMOVED_KEYS[start]
+
+        if captured != EMPTY:
+            pieces[captured] ^= target_bit
+            colors[captured // 6] ^= target_bit
+            self.occupied ^= target_bit
+            key ^= PIECE_KEYS[captured][target]
+            if unmoved & target_bit and _CASTLING_PIECE[captured]:
+                key ^= UNMOVED_KEYS[target]
+
+        pieces[p] ^= start_bit
+        if move & PROMOTION:
+            p = p - PAWN + QUEEN
+        pieces[p] |= target_bit
+        colors[self.turn] ^= start_bit | target_bit
+        self.occupied ^= start_bit
+        self.occupied |= target_bit
+        mailbox[start] = EMPTY
+        mailbox[target] = p
+        key ^= PIECE_KEYS[p][target]
+        self.key = key
+        self.seen[key] = self.seen.get(key, 0) + 1
+
+        self.unmoved = unmoved & ~(start_bit | target_bit)
+        self.turn ^= 1
+        self.move_count += 1
+
+    def unmake_move(self) -> int:
+        """takes back the last move of ``make_move`` and returns it"""
+        record = self.history.pop()
+        move = record & 0x1FFFF
+        start = move & 0xFF
+        target = move >> 8 & 0xFF
+        start_bit = 1 << start
+        target_bit = 1 << target
+        mailbox = self.mailbox
+        pieces = self.pieces
+        colors = self.colors
+        self.turn ^= 1
+        self.move_count -= 1
+        seen = self.seen
+        count = seen[self.key] - 1
+        if count:
+            seen[self.key] = count
+        else:
+            del seen[self.key]
+        self.key = self.keys.pop()
+
+        p = mailbox[target]
+        pieces[p] ^= target_bit
+        if move & PROMOTION:
+            p = p - QUEEN + PAWN
+        pieces[p] |= start_bit
+        colors[self.turn] ^= start_bit | target_bit
+        mailbox[start] = p
+        self.occupied |= start_bit
+
+        captured = (record >> 17 & 0xF) - 1
+        if captured != EMPTY:
+            pieces[captured] |= target_bit
+            colors[captured // 6] |= target_bit
+            mailbox[target] = captured
+        else:
+            self.occupied ^= target_bit
+            mailbox[target] = EMPTY
+
+        self.unmoved |= (record >> 21 & 1) * start_bit | (record >> 22 & 1) * target_bit
+        return move
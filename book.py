@@ -0,0 +1,161 @@
+"""
+Opening book: how often each move was played in stored games and how it scored.
+
+    python book.py build BOOK GAMES ... [--plies N] [--min-count N]
+    python book.py show BOOK
+
+``GAMES`` are archives of ``notation.write_games`` or text files with one game per
+line (``notation.game_to_text``, optionally after a game number like the results of
+``tournament.py``).
+
+The book file is the ``MAGIC`` header and records of zobrist key, move code (see
+``notation.pack_move``), count and score, sorted by key. Lookups binary search the
+memory mapped file, so a book is never loaded as a whole.
+"""
+import argparse
+import mmap
+import random
+import struct
+import time
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from bitboard import WHITE, Position
+from notation import (
+    BLACK_WINS, MAGIC as ARCHIVE_MAGIC, WHITE_WINS, InvalidGame,
+    game_from_text, move_to_text, pack_move, read_games, replay, unpack_move
+)
+
+MAGIC = b"CCOB"
+_RECORD = struct.Struct(">QHII")
+
+
+class BookMove(NamedTuple):
+    move: int
+    count: int
+    score: float    # average points of the player making the move
+
+
+def _read_games(path: str) -> Iterator[Tuple[List[int], str]]:
+    """the moves and result of every game in an archive or a text file"""
+    with open(path, "rb") as file:
+        if file.read(len(ARCHIVE_MAGIC)) == ARCHIVE_MAGIC:
+            file.seek(0)
+            for codes, result in read_games(file):
+                yield replay(codes, result)[0]
+            return
+
+    with open(path) as file:
+        for line in file:
+            if line.startswith("#") or not line.strip():
+                continue
+            words = line.split()
+            if words[0].isdigit():
+                words = words[1:]
+            yield game_from_text(" ".join(words))
+
+
+def build(paths: List[str], book: str, plies: int = 20, min_count: int = 1) -> int:
+    """writes the first ``plies`` moves of all games to ``book``; returns the number of entries"""
+    # (key, move code) -> [count, half points of the player to move]
+    entries: Dict[Tuple[int, int], List[int]] = {}
+    for path in paths:
+        for moves, result in _read_games(path):
+            position = Position.initial()
+            for move in moves[:plies]:
+                points = 1    # draws and unfinished games
+                if result in (WHITE_WINS, BLACK_WINS):
+                    points = 2 if (result == WHITE_WINS) == (position.turn == WHITE) else 0
+                entry = entries.setdefault((position.key, pack_move(move)), [0, 0])
+                entry[0] += 1
+                entry[1] += points
+                position.make_move(move)
+
+    records = sorted(
+        (key, code, count, points) for (key, code), (count, points) in entries.items() if count >= min_count
+    )
+    with open(book, "wb") as file:
+        file.write(MAGIC)
+        for record in records:
+            file.write(_RECORD.pack(*record))
+    return len(records)
+
+
+class OpeningBook():
+    """a book file on disk, see ``build``"""
+
+    def __init__(self, path: str):
+        self.file = open(path, "rb")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.data[:len(MAGIC)] != MAGIC:
+            raise ValueError("%s is no opening book" % path)
+        self.size = (len(self.data) - len(MAGIC)) // _RECORD.size
+
+    def _key_at(self, i: int) -> int:
+        return _RECORD.unpack_from(self.data, len(MAGIC) + i * _RECORD.size)[0]
+
+    def lookup(self, position: Position) -> List[BookMove]:
+        """the book moves of ``position``, most played first"""
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) // 2
+            if self._key_at(middle) < position.key:
+                low = middle + 1
+            else:
+                high = middle
+
+        moves = []
+        for i in range(low, self.size):
+            key, code, count, points = _RECORD.unpack_from(self.data, len(MAGIC) + i * _RECORD.size)
+            if key != position.key:
+                break
+            try:
+                move = unpack_move(position, code)
+            except InvalidGame:
+                continue    # another position with the same key
+            moves.append(BookMove(move, count, points / 2 / count))
+        moves.sort(key=lambda book_move: book_move.count, reverse=True)
+        return moves
+
+    def choose(self, position: Position, rng: Optional[random.Random] = None) -> Optional[int]:
+        """a book move picked by how often it was played, or the most played one without ``rng``"""
+        moves = self.lookup(position)
+        if not moves:
+            return None
+        if rng is None:
+            return moves[0].move
+        return rng.choices([book_move.move for book_move in moves], [book_move.count for book_move in moves])[0]
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="builds or shows an opening book")
+    parser.add_argument("command", choices=("build", "show"))
+    parser.add_argument("book")
+    parser.add_argument("games", nargs="*")
+    parser.add_argument("--plies", type=int, default=20)
+    parser.add_argument("--min-count", type=int, default=1)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        start = time.perf_counter()
+        count = build(args.games, args.book, args.plies, args.min_count)
+        print("%i entries written in %.2fs" % (count, time.perf_counter() - start))
+        return
+
+    book = OpeningBook(args.book)
+    position = Position.initial()
+    for book_move in book.lookup(position):
+        print("%s %i games, %.0f%%" % (move_to_text(book_move.move), book_move.count, 100 * book_move.score))
+
+    lookups = 10000
+    start = time.perf_counter()
+    for _ in range(lookups):
+        book.lookup(position)
+    print("%i entries, %.1f us per lookup" % (book.size, (time.perf_counter() - start) / lookups * 1e6))
+
+
+if __name__ == "__main__":
+    main()
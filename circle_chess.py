@@ -1,13 +1,20 @@
 from abc import ABCMeta, abstractmethod
 from enum import Enum, auto
+import logging
 import math
-from typing import List, Tuple, Callable
+from typing import Iterator, List, Optional, Tuple, Callable
 
-import pygame
+from bitboard import (
+    FILES, RANKS, SQUARES, WHITE, BLACK, KING, PROMOTION, LABELS,
+    Position, does_tile_exist, square, tile, piece, piece_color, piece_kind, bits, move_start, move_target
+)
+from attacks import (
+    ORTHOGONAL, DIAGONAL, ALL_DIRECTIONS, KNIGHT_ATTACKS, KING_ATTACKS, PAWN_ATTACKS, PAWN_PUSHES, slide_path
+)
+from movegen import generate_legal_moves, perft
+from attackmap import AttackMap
 
-FILES = 12
-TOTAL_FILES = 2 * FILES
-RANKS = 8
+logger = logging.getLogger(__name__)
 
 def signum(x, default: int = 0) -> int:
     if x > 0:
@@ -21,184 +28,115 @@ def figure_mapping(figures: List["Figure"]):
     return {f.pos: f for f in figures}
 
 
+def figure_mask(figures: List["Figure"]) -> int:
+    mask = 0
+    for f in figures:
+        mask |= 1 << square(*f.pos)
+    return mask
+
+
+def slider_move_path(start: Tuple[int, int], new_pos: Tuple[int, int], directions, opponents_figures: List["Figure"], my_figures: List["Figure"]) -> List[Tuple[int, int]]:
+    if not does_tile_exist(*new_pos):
+        return []
+    target = square(*new_pos)
+    my_mask = figure_mask(my_figures)
+    if my_mask >> target & 1:
+        return []
+    path = slide_path(square(*start), target, directions, my_mask | figure_mask(opponents_figures))
+    return [tile(sq) for sq in path]
+
+
+def leaper_move_path(start: Tuple[int, int], new_pos: Tuple[int, int], table: List[int], my_figures: List["Figure"]) -> List[Tuple[int, int]]:
+    if not does_tile_exist(*new_pos):
+        return []
+    target = square(*new_pos)
+    if table[square(*start)] >> target & 1 and not figure_mask(my_figures) >> target & 1:
+        return [new_pos]
+    return []
+
+
 class GameState(Enum):
     RUNNING = auto()
     CANCELED = auto()
     DONE = auto()
-    
-def does_tile_exist(file: int, rank: int) -> bool:
-    return rank != RANKS - 1 or file % FILES not in (0, 1, FILES - 2, FILES - 1)
+
 
 class Figure():
 
-    def __init__(self, start_file: int, start_rank: int,  label: str, font: pygame.font.Font, color):
+    def __init__(self, start_file: int, start_rank: int,  label: str, color):
         self.label = label
-        self.font = font
         self.color = color
         self.pos = (start_file, start_rank)
-        self.surface = ChesssBoard.IMAGES[self.label].convert_alpha()
         self.moved = False    # needed for castling
         
     def move_path(self, new_pos: Tuple[int, int], opponents_figures: List["Figure"], my_figures: List["Figure"]) -> List[Tuple[int, int]]:
         raise NotImplementedError()
     
 class Rook(Figure):
-    def __init__(self, start_file: int, start_rank: int, white: bool, font: pygame.font.Font):
-        Figure.__init__(self, start_file, start_rank, "r" if white else "R", font, ChesssBoard.COLOR_WHITE if white else ChesssBoard.COLOR_BLACK)
+    def __init__(self, start_file: int, start_rank: int, white: bool):
+        Figure.__init__(self, start_file, start_rank, "r" if white else "R", ChesssBoard.COLOR_WHITE if white else ChesssBoard.COLOR_BLACK)
     
     def move_path(self, new_pos: Tuple[int, int], opponents_figures: List["Figure"], my_figures: List["Figure"]) -> List[Tuple[int, int]]:
-        opp_pos_map = figure_mapping(opponents_figures)
-        pos_map = figure_mapping(my_figures)
-        
-        if new_pos[0] == self.pos[0]:  # same rank
-            s = signum(new_pos[1] - self.pos[1]) 
-            path = [(self.pos[0], i) for i in range(self.pos[1], new_pos[1] + s * 1, s)]
-            path = path[1:]
-            for pos in path:
-                if pos in pos_map.keys():
-                    return []
-                elif pos != path[-1] and pos in opp_pos_map.keys():
-                    return []
-
-            return path
-        
-        elif new_pos[1] != self.pos[1]:
-            return []
-        
-        path = [self.pos]
-        i = self.pos[0]
-        while path[-1] != new_pos:
-            i = (i + 1) % (2 * FILES) 
-            path.append((i, self.pos[1]))
-            
-        path = path[1:]
-
-        for pos in path:
-            if pos in pos_map.keys():
-                break
-            elif pos != path[-1] and pos in opp_pos_map.keys():
-                break
-        else:
-            return path
-
-        path = [self.pos]
-        i = self.pos[0]
-        while path[-1] != new_pos:
-            i = (i - 1) % (2 * FILES) 
-            path.append((i, self.pos[1]))
-
-        path = path[1:]
-        for pos in path:
-            if pos in pos_map.keys():
-                return []
-            elif pos != path[-1] and pos in opp_pos_map.keys():
-                return []
-
-        return path 
+        return slider_move_path(self.pos, new_pos, ORTHOGONAL, opponents_figures, my_figures)
 
 class Knight(Figure):
-    def __init__(self, start_file: int, start_rank: int, white: bool, font: pygame.font.Font):
-        Figure.__init__(self, start_file, start_rank, "n" if white else "N", font, ChesssBoard.COLOR_WHITE if white else ChesssBoard.COLOR_BLACK)
+    def __init__(self, start_file: int, start_rank: int, white: bool):
+        Figure.__init__(self, start_file, start_rank, "n" if white else "N", ChesssBoard.COLOR_WHITE if white else ChesssBoard.COLOR_BLACK)
     
     def move_path(self, new_pos: Tuple[int, int], _, my_figures: List[Figure]) -> List[Tuple[int, int]]:
-        if (abs(new_pos[0] - self.pos[0]) == 1 and abs(new_pos[1] - self.pos[1]) == 2) or (abs(new_pos[0] - self.pos[0]) == 2 and abs(new_pos[1] - self.pos[1]) == 1):
-            pos_map = figure_mapping(my_figures)
-            if new_pos not in pos_map.keys():
-                return [new_pos]
-        return []
+        return leaper_move_path(self.pos, new_pos, KNIGHT_ATTACKS, my_figures)
 
 class Bishop(Figure):
-    def __init__(self, start_file: int, start_rank: int, white: bool, font: pygame.font.Font):
-        Figure.__init__(self, start_file, start_rank, "b" if white else "B", font, ChesssBoard.COLOR_WHITE if white else ChesssBoard.COLOR_BLACK)
+    def __init__(self, start_file: int, start_rank: int, white: bool):
+        Figure.__init__(self, start_file, start_rank, "b" if white else "B", ChesssBoard.COLOR_WHITE if white else ChesssBoard.COLOR_BLACK)
     
     def move_path(self, new_pos: Tuple[int, int], opponents_figures: List[Figure], my_figures: List[Figure]) -> List[Tuple[int, int]]:
-        diff = abs(new_pos[0] - self.pos[0])
-        sf = signum(new_pos[0] - self.pos[0]) 
-        if diff >= RANKS:
-            sf = -sf
-        sr = signum(new_pos[1] - self.pos[1]) 
-        
-        f = self.pos[0]
-        r = self.pos[1]
-        path = [self.pos]
-        while path[-1] != new_pos:
-            if len(path) >= 1:
-                if new_pos[0] == f or new_pos[1] == r:
-                    return []  # can't be a legal move if one of them is hitting the coordinate and the other one doesn't
-
-            f = (f + sf) % (2 * FILES) 
-            r = (r + sr) % RANKS 
-            path.append((f, r))
-
-        path = path[1:]
-
-        pos_map = figure_mapping(my_figures)
-        opp_pos_map = figure_mapping(opponents_figures)
-
-        for pos in path:
-            if pos in pos_map.keys():
-                print(pos)
-                return []
-            elif pos != path[-1] and pos in opp_pos_map.keys():
-                print(pos)
-                return []
-
-        return path
+        return slider_move_path(self.pos, new_pos, DIAGONAL, opponents_figures, my_figures)
 
 
 class Queen(Figure):
-    def __init__(self, start_file: int, start_rank: int, white: bool, font: pygame.font.Font):
-        Figure.__init__(self, start_file, start_rank, "q" if white else "Q", font, ChesssBoard.COLOR_WHITE if white else ChesssBoard.COLOR_BLACK)
+    def __init__(self, start_file: int, start_rank: int, white: bool):
+        Figure.__init__(self, start_file, start_rank, "q" if white else "Q", ChesssBoard.COLOR_WHITE if white else ChesssBoard.COLOR_BLACK)
 
     def move_path(self, new_pos: Tuple[int, int], opponents_figures: List["Figure"], my_figures: List[Figure]) -> List[Tuple[int, int]]:
-        rook_path = Rook.move_path(self, new_pos, opponents_figures, my_figures)  # really dangerous; ik
-        if rook_path:
-            return rook_path
-        
-        bishop_path = Bishop.move_path(self, new_pos, opponents_figures, my_figures)  # really dangerous; ik
-        return bishop_path
+        return slider_move_path(self.pos, new_pos, ALL_DIRECTIONS, opponents_figures, my_figures)
 
 
 class King(Figure):
-    def __init__(self, start_file: int, start_rank: int, white: bool, font: pygame.font.Font):
-        Figure.__init__(self, start_file, start_rank, "k" if white else "K", font, ChesssBoard.COLOR_WHITE if white else ChesssBoard.COLOR_BLACK)
+    def __init__(self, start_file: int, start_rank: int, white: bool):
+        Figure.__init__(self, start_file, start_rank, "k" if white else "K", ChesssBoard.COLOR_WHITE if white else ChesssBoard.COLOR_BLACK)
         self.castle_one = ((start_file - 2 - (not white)) % (2 * FILES), start_rank)
         self.castle_two = ((start_file + 3 - (not white)) % (2 * FILES), start_rank)
-        print(self.label, self.pos, self.castle_one, self.castle_two)
+        logger.debug("%s %s castles to %s or %s", self.label, self.pos, self.castle_one, self.castle_two)
     
     def move_path(self, new_pos: Tuple[int, int], _, my_figures: List["Figure"]) -> List[Tuple[int, int]]:
-        if abs(new_pos[0] - self.pos[0]) <= 1 and abs(new_pos[1] - self.pos[1]) <= 1:
-            figure_map = figure_mapping(my_figures)
-            if new_pos not in figure_map.keys():
-                return [new_pos]
-        
-        return []
+        return leaper_move_path(self.pos, new_pos, KING_ATTACKS, my_figures)
 
 
 class Pawn(Figure):
-    def __init__(self, start_file: int, start_rank: int, white: bool, font: pygame.font.Font):
-        Figure.__init__(self, start_file, start_rank, "p" if white else "P", font, ChesssBoard.COLOR_WHITE if white else ChesssBoard.COLOR_BLACK)
+    def __init__(self, start_file: int, start_rank: int, white: bool):
+        Figure.__init__(self, start_file, start_rank, "p" if white else "P", ChesssBoard.COLOR_WHITE if white else ChesssBoard.COLOR_BLACK)
     
-    def move_path(self, new_pos: Tuple[int, int], opponents_figures: List["Figure"], _) -> List[Tuple[int, int]]:
-        if self.pos[0] != new_pos[0]:
-            if self.pos[1] - new_pos[1] != 1:
-                return []
-            
-            for o_piece in opponents_figures:
-                if o_piece.pos == new_pos:
-                    return [new_pos]
-            else:
-                return []
-        
-        if self.pos[1] == 6 and self.pos[1] - new_pos[1] == 2: 
-            return [(self.pos[0], self.pos[1] + 1), new_pos]
-        
-        elif self.pos[1] - new_pos[1] == 1:
-            for o_piece in opponents_figures:
-                if o_piece.pos == new_pos:
-                    return []
+    def move_path(self, new_pos: Tuple[int, int], opponents_figures: List["Figure"], my_figures: List["Figure"]) -> List[Tuple[int, int]]:
+        if not does_tile_exist(*new_pos):
+            return []
+
+        start = square(*self.pos)
+        target = square(*new_pos)
+        opp_mask = figure_mask(opponents_figures)
+        if PAWN_ATTACKS[start] >> target & 1:
+            return [new_pos] if opp_mask >> target & 1 else []
 
+        occupied = opp_mask | figure_mask(my_figures)
+        step = PAWN_PUSHES[start]
+        if step == -1 or occupied >> step & 1:
+            return []
+
+        if target == step:
             return [new_pos]
+
+        if self.pos[1] == RANKS - 2 and target == PAWN_PUSHES[step] and not occupied >> target & 1:
+            return [tile(step), new_pos]
         return []
             
 
@@ -211,112 +149,145 @@ class ChesssBoard():
     WHITE_TURN = 0
     BLACK_TURN = 1
 
-    IMAGES = {
-        "q": pygame.image.load("pieces/wQueen.png"),
-        "Q": pygame.image.load("pieces/bQueen.png"),
-        "k": pygame.image.load("pieces/wKing.png"),
-        "K": pygame.image.load("pieces/bKing.png"),
-        "r": pygame.image.load("pieces/wRook.png"),
-        "R": pygame.image.load("pieces/bRook.png"),
-        "b": pygame.image.load("pieces/wBishop.png"),
-        "B": pygame.image.load("pieces/bBishop.png"),
-        "n": pygame.image.load("pieces/wKnight.png"),
-        "N": pygame.image.load("pieces/bKnight.png"),
-        "p": pygame.image.load("pieces/wPawn.png"),
-        "P": pygame.image.load("pieces/bPawn.png"),
-    }
-    
     def __init__(self):
-        font = pygame.font.Font(pygame.font.get_default_font(), 25)
-        font.set_bold(True)
-        self.move_count = 0
+        self.position = Position.initial()
+        self.attack_map = AttackMap(self.position)
+        self.state = GameState.RUNNING
         self.checked = None
         self.winner = None
-        self.white_pieces: List[Figure] = [
-            Rook(14, 7, True, font),
-            Knight(15, 7, True, font),
-            Bishop(16, 7, True, font),
-            Queen(17, 7, True, font),
-            King(18, 7, True, font),
-            Bishop(19, 7, True, font),
-            Knight(20, 7, True, font),
-            Rook(21, 7, True, font)
-        ]
-
-        self.black_pieces: List[Figure] = [ 
-            Rook(2, 7, False, font),
-            Knight(3, 7, False, font),
-            Bishop(4, 7, False, font),
-            King(5, 7, False, font),
-            Queen(6, 7, False, font),
-            Bishop(7, 7, False, font),
-            Knight(8, 7, False, font),
-            Rook(9, 7, False, font)
-        ]
-
-        for i in range(8):
-            self.white_pieces.append(
-                Pawn(i + FILES + 2, 6, True, font)
-            )
-            self.black_pieces.append(
-                Pawn(i + 2, 6, False, font)
-            )
-        
+        self._checked_history: List[Optional[Tuple[int, int]]] = []
+        self._views: Optional[List[Optional[Figure]]] = None
+        # the classes of the figures returned by ``figure_at`` etc. by piece kind
+        self.figure_types = FIGURE_TYPES
+
+    @property
+    def move_count(self) -> int:
+        return self.position.move_count
+
+    @property
+    def white_pieces(self) -> List[Figure]:
+        return self._pieces(WHITE)
+
+    @property
+    def black_pieces(self) -> List[Figure]:
+        return self._pieces(BLACK)
+
+    def _figures(self) -> List[Optional[Figure]]:
+        """square indexed figures; rebuilt from the position after every move"""
+        if self._views is None:
+            views: List[Optional[Figure]] = [None] * SQUARES
+            for sq in bits(self.position.occupied):
+                p = self.position.mailbox[sq]
+                figure = self.figure_types[piece_kind(p)](*tile(sq), piece_color(p) == WHITE)
+                figure.moved = self.position.has_moved(sq)
+                views[sq] = figure
+            self._views = views
+        return self._views
+
+    def _pieces(self, color: int) -> List[Figure]:
+        views = self._figures()
+        return [views[sq] for sq in bits(self.position.colors[color])]
+
+    def figure_at(self, pos: Tuple[int, int]) -> Optional[Figure]:
+        return self._figures()[square(*pos)]
+
+    def is_own_piece(self, pos: Tuple[int, int]) -> bool:
+        return bool(self.position.colors[self.get_player()] >> square(*pos) & 1)
+
+    def generate_legal_moves(self) -> Iterator[int]:
+        """yields the legal moves of the player to move, see ``bitboard.encode_move``"""
+        yield from generate_legal_moves(self.position, self.attack_map)
+
+    def perft(self, depth: int) -> int:
+        return perft(self.position, depth)
+
     def move_piece(self, start: Tuple[int, int], target: Tuple[int, int]) -> bool:
-        if not does_tile_exist(*start) or not does_tile_exist(*target):
+        if self.state is not GameState.RUNNING:
             return False
 
-        figures = self.white_pieces if self.get_player() == ChesssBoard.WHITE_TURN else self.black_pieces
-        opp_figures = self.white_pieces if self.get_player() == ChesssBoard.BLACK_TURN else self.black_pieces
-        for piece in figures:
-            if piece.pos == start:
-                selected_piece = piece
-                break
-        else:
-            print("Invalid piece")
+        if not does_tile_exist(*start) or not does_tile_exist(*target):
             return False
 
-        path = selected_piece.move_path(target, opp_figures, figures)
-        if not path:
+        position = self.position
+        player = self.get_player()
+        start_sq = square(*start)
+        target_sq = square(*target)
+        if position.color_at(start_sq) != player:
+            logger.debug("no piece of the player to move on %s", start)
             return False
-        
-        for p in opp_figures:
-            if p.pos == path[-1]:
-                if isinstance(p, King):
-                    print("King is not killable")
-                    return False
 
-                opp_figures.remove(p)        
+        for move in self.generate_legal_moves():
+            if move_start(move) == start_sq and move_target(move) == target_sq:
                 break
+        else:
+            return False
 
-        if selected_piece.label.lower() == "p" and selected_piece.pos[1] == 0:
-            print("Promotion of a pawn. For now instant queening. No other possibility")
-            figures.append(Queen(*selected_piece.pos, selected_piece.label.islower(), selected_piece.font))
-            figures.remove(selected_piece)
-
-        selected_piece.pos = path[-1]
+        if move & PROMOTION:
+            logger.info("promotion of a pawn, for now always to a queen")
 
-        self.check_checkmate(figures, opp_figures, next(filter(lambda x: x.label.lower() == "k", opp_figures)))
-        
-        self.move_count += 1
-        selected_piece.moved = True
+        self.make_move(move)
 
-        
         return True
 
-    def check_checkmate(self, figures: List[Figure], opp_figures: List[Figure], king: King):
-        for f in figures:
-            path = f.move_path(king.pos, opp_figures, figures)
-            if path:
-                self.checked = path[-1]
-                print("Schach " + king.label)
-                break
+    def make_move(self, move: int):
+        """plays a legal move; can be taken back with ``unmake_move``"""
+        self._checked_history.append(self.checked)
+        self.attack_map.make_move(move)
+        self._views = None
+        self.check_checkmate()
+
+    def unmake_move(self) -> int:
+        self.checked = self._checked_history.pop()
+        self.state = GameState.RUNNING
+        self.winner = None
+        self._views = None
+        return self.attack_map.unmake_move()
+
+    def checkers(self) -> List[Tuple[int, int]]:
+        """tiles of the pieces giving check to the player to move"""
+        return [tile(sq) for sq in bits(self.attack_map.checkers(self.get_player()))]
+
+    def check_checkmate(self):
+        player = self.get_player()
+        if self.attack_map.in_check(player):
+            self.checked = tile(self.position.king_square(player))
+            logger.debug("check against %s", LABELS[piece(player, KING)])
         else:
             self.checked = None
 
-        print("Checked:", self.checked)
-            
-            
+        if not generate_legal_moves(self.position, self.attack_map):
+            self.state = GameState.DONE
+            self.winner = None if self.checked is None else 1 - player    # stalemate is a draw
+        elif self.position.repetitions() >= 3:
+            self.state = GameState.DONE    # threefold repetition is a draw
+            self.winner = None
+
     def get_player(self):
         return self.move_count % 2
- 
\ No newline at end of file
+ 
+
+
+FIGURE_TYPES = (Pawn, Knight, Bishop, Rook, Queen, King)
+
+
+def main():
+    """measures how long importing the rules and setting up a board takes"""
+    import os
+    import subprocess
+    import sys
+    import timeit
+
+    command = [
+        sys.executable, "-c",
+        "import sys, time; t = time.perf_counter(); import circle_chess; "
+        "print(time.perf_counter() - t, 'pygame' in sys.modules)"
+    ]
+    runs = [subprocess.check_output(command, cwd=os.path.dirname(os.path.abspath(__file__))).split() for _ in range(5)]
+    import_time = min(float(seconds) for seconds, _ in runs)
+    construction_time = min(timeit.repeat(ChesssBoard, number=100, repeat=5)) / 100
+    print("import: %.1f ms (pygame imported: %s)" % (import_time * 1000, runs[0][1].decode()))
+    print("ChesssBoard(): %.1f us" % (construction_time * 1e6))
+
+
+if __name__ == "__main__":
+    main()
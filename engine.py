@@ -0,0 +1,285 @@
+"""
+Computer player: alpha-beta search with iterative deepening.
+
+    python engine.py [seconds]
+
+searches the start position and prints every finished iteration.
+"""
+import sys
+import time
+from typing import TYPE_CHECKING, Callable, List, NamedTuple, Optional
+
+from bitboard import TOTAL_FILES, RANKS, EMPTY, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, SQUARES, PROMOTION, Position, bits, tile
+from movegen import generate_legal_moves, generate_moves, in_check, is_legal
+from transposition import EXACT, LOWER, UPPER, TranspositionTable
+
+if TYPE_CHECKING:
+    from book import OpeningBook
+
+INFINITY = 1 << 20
+MATE = 100000
+MAX_PLY = 128
+DRAW = 0
+
+PIECE_VALUES = (100, 320, 330, 500, 900, 0)
+_VALUES = PIECE_VALUES * 2 + (0,)    # indexed by piece, EMPTY included
+
+
+def evaluate(position: Position) -> int:
+    """material and pawn advancement from the view of the player to move"""
+    pieces = position.pieces
+    score = 0
+    for kind in (KNIGHT, BISHOP, ROOK, QUEEN):
+        score += PIECE_VALUES[kind] * (pieces[kind].bit_count() - pieces[6 + kind].bit_count())
+    # pawns walk towards rank 0 where they promote
+    for sq in bits(pieces[PAWN]):
+        score += PIECE_VALUES[PAWN] + (RANKS - 2 - sq // TOTAL_FILES) * 8
+    for sq in bits(pieces[6 + PAWN]):
+        score -= PIECE_VALUES[PAWN] + (RANKS - 2 - sq // TOTAL_FILES) * 8
+    return score if position.turn == 0 else -score
+
+
+class SearchInfo(NamedTuple):
+    depth: int
+    score: int
+    nodes: int
+    time: float
+    pv: List[int]
+
+    @property
+    def move(self) -> Optional[int]:
+        return self.pv[0] if self.pv else None
+
+    @property
+    def nps(self) -> int:
+        return int(self.nodes / max(self.time, 1e-9))
+
+    def __str__(self) -> str:
+        return "depth %i score %i nodes %i nps %i time %.2f pv %s" % (
+            self.depth, self.score, self.nodes, self.nps, self.time,
+            " ".join("%s-%s" % (tile(m & 0xFF), tile(m >> 8 & 0xFF)) for m in self.pv)
+        )
+
+
+class SearchAborted(Exception):
+    pass
+
+
+class Engine():
+    """
+    Principal variation search with a transposition table, quiescence search and
+    move ordering by transposition table move, MVV-LVA, killer moves and history.
+    """
+
+    def __init__(self, tt_size_mb: float = 16, evaluate: Callable[[Position], int] = evaluate,
+                 tt: Optional[TranspositionTable] = None, book: Optional["OpeningBook"] = None):
+        self.tt = tt if tt is not None else TranspositionTable(tt_size_mb)
+        self.evaluate = evaluate
+        self.book = book
+        self.stopped = False
+        self.nodes = 0
+        self.position = Position()
+        self.killers = [[0, 0] for _ in range(MAX_PLY + 1)]
+        self.history = [[0] * SQUARES for _ in range(12)]
+        self.pv: List[List[int]] = [[] for _ in range(MAX_PLY + 1)]
+        self._deadline = 0.0
+        self._node_limit = 0
+
+    def stop(self):
+        """aborts a running search (e.g. from another thread); the last iteration is kept"""
+        self.stopped = True
+
+    def search(self, position: Position, max_depth: int = MAX_PLY, time_limit: Optional[float] = None,
+               node_limit: Optional[int] = None, info: Optional[Callable[[SearchInfo], None]] = None,
+               start_depth: int = 1) -> SearchInfo:
+        """
+        Searches ``position`` (e.g. ``ChesssBoard.position``, which is not modified)
+        until ``max_depth``, ``time_limit`` seconds or ``node_limit`` nodes are reached.
+        ``info`` is called after every finished iteration. Positions in the book are
+        not searched, the most played book move is returned with depth 0.
+        """
+        if self.book is not None:
+            start = time.perf_counter()
+            move = self.book.choose(position)
+            if move is not None:
+                return SearchInfo(0, 0, 0, time.perf_counter() - start, [move])
+
+        self.position = position.copy()
+        self.stopped = False
+        self.nodes = 0
+        self.killers = [[0, 0] for _ in range(MAX_PLY + 1)]
+        self.history = [[0] * SQUARES for _ in range(12)]
+        self.tt.new_search()
+        start = time.perf_counter()
+        self._deadline = start + time_limit if time_limit is not None else float("inf")
+        self._node_limit = node_limit or 0
+
+        moves = generate_legal_moves(self.position)
+        result = SearchInfo(0, 0, 0, 0.0, moves[:1])
+        if len(moves) <= 1:
+            return result
+
+        for depth in range(min(start_depth, max_depth), max_depth + 1):
+            try:
+                score = self._search(depth, -INFINITY, INFINITY, 0)
+            except SearchAborted:
+                break
+            result = SearchInfo(depth, score, self.nodes, time.perf_counter() - start, self.pv[0][:])
+            if info is not None:
+                info(result)
+            if abs(score) >= MATE - MAX_PLY:
+                break
+            # the next iteration takes a multiple of this one and would not finish
+            if time_limit is not None and result.time > time_limit / 2:
+                break
+
+        return result._replace(nodes=self.nodes, time=time.perf_counter() - start)
+
+    def _check_limits(self):
+        if self.stopped or time.perf_counter() > self._deadline or 0 < self._node_limit <= self.nodes:
+            raise SearchAborted()
+
+    def _order(self, moves: List[int], tt_move: int, ply: int) -> List[int]:
+        mailbox = self.position.mailbox
+        killers = self.killers[ply]
+        history = self.history
+        keyed = []
+        for move in moves:
+            target = move >> 8 & 0xFF
+            if move == tt_move:
+                key = 1 << 30
+            elif mailbox[target] != EMPTY or move & PROMOTION:
+                key = (1 << 28) + 10 * _VALUES[mailbox[target]] - _VALUES[mailbox[move & 0xFF]] + (move & PROMOTION)
+            elif move == killers[0]:
+                key = 1 << 27
+            elif move == killers[1]:
+                key = (1 << 27) - 1
+            else:
+                key = history[mailbox[move & 0xFF]][target]
+            keyed.append((key, move))
+        keyed.sort(reverse=True)
+        return [move for _, move in keyed]
+
+    def _search(self, depth: int, alpha: int, beta: int, ply: int) -> int:
+        position = self.position
+        self.nodes += 1
+        if not self.nodes & 1023:
+            self._check_limits()
+        self.pv[ply] = []
+
+        if ply and position.repetitions() > 1:
+            return DRAW
+
+        checked = in_check(position, position.turn)
+        if checked:
+            depth += 1
+        if depth <= 0 or ply >= MAX_PLY:
+            return self._quiescence(alpha, beta, ply)
+
+        tt_move = 0
+        entry = self.tt.probe(position.key)
+        if entry is not None:
+            tt_move = entry.move
+            if ply and entry.depth >= depth and beta - alpha == 1:
+                score = _from_tt(entry.score, ply)
+                if entry.bound == EXACT or (entry.bound == LOWER and score >= beta) or (entry.bound == UPPER and score <= alpha):
+                    return score
+
+        moves = generate_legal_moves(position)
+        if not moves:
+            return -MATE + ply if checked else DRAW
+
+        original_alpha = alpha
+        best_score = -INFINITY
+        best_move = 0
+        for i, move in enumerate(self._order(moves, tt_move, ply)):
+            position.make_move(move)
+            if i == 0:
+                score = -self._search(depth - 1, -beta, -alpha, ply + 1)
+            else:
+                score = -self._search(depth - 1, -alpha - 1, -alpha, ply + 1)
+                if alpha < score < beta:
+                    score = -self._search(depth - 1, -beta, -alpha, ply + 1)
+            position.unmake_move()
+
+            if score > best_score:
+                best_score = score
+                best_move = move
+                if score > alpha:
+                    alpha = score
+                    self.pv[ply] = [move] + self.pv[ply + 1]
+                    if alpha >= beta:
+                        if position.mailbox[move >> 8 & 0xFF] == EMPTY:
+                            self._remember_quiet(move, depth, ply)
+                        break
+
+        if best_score >= beta:
+            bound = LOWER
+        elif best_score > original_alpha:
+            bound = EXACT
+        else:
+            bound = UPPER
+        self.tt.store(position.key, depth, _to_tt(best_score, ply), bound, best_move)
+        return best_score
+
+    def _remember_quiet(self, move: int, depth: int, ply: int):
+        killers = self.killers[ply]
+        if killers[0] != move:
+            killers[1] = killers[0]
+            killers[0] = move
+        self.history[self.position.mailbox[move & 0xFF]][move >> 8 & 0xFF] += depth * depth
+
+    def _quiescence(self, alpha: int, beta: int, ply: int) -> int:
+        position = self.position
+        self.nodes += 1
+        if not self.nodes & 1023:
+            self._check_limits()
+        self.pv[ply] = []
+
+        best_score = self.evaluate(position)
+        if best_score >= beta or ply >= MAX_PLY:
+            return best_score
+        if best_score > alpha:
+            alpha = best_score
+
+        for move in self._order(generate_moves(position, captures_only=True), 0, ply):
+            if not is_legal(position, move):
+                continue
+            position.make_move(move)
+            score = -self._quiescence(-beta, -alpha, ply + 1)
+            position.unmake_move()
+            if score > best_score:
+                best_score = score
+                if score > alpha:
+                    alpha = score
+                    self.pv[ply] = [move] + self.pv[ply + 1]
+                    if alpha >= beta:
+                        break
+        return best_score
+
+
+def _to_tt(score: int, ply: int) -> int:
+    """mate scores are stored relative to the node instead of the root"""
+    if score >= MATE - MAX_PLY:
+        return score + ply
+    if score <= -MATE + MAX_PLY:
+        return score - ply
+    return score
+
+
+def _from_tt(score: int, ply: int) -> int:
+    if score >= MATE - MAX_PLY:
+        return score - ply
+    if score <= -MATE + MAX_PLY:
+        return score + ply
+    return score
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 5
+    result = Engine().search(Position.initial(), time_limit=seconds, info=print)
+    print("bestmove", result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+"""
+Static evaluation of single positions and of whole batches with numpy.
+
+A batch is a stack of piece planes of shape ``(N, 12, 24, 8)``: ``planes[i, p, file, rank]``
+is 1 if piece ``p`` (see ``bitboard.piece``) stands on the tile. ``evaluate`` and
+``evaluate_batch`` compute the same score from material, piece-square tables and the
+mobility of knights and sliders.
+
+    python evaluation.py
+
+measures positions per second for batches of 1 to 10000 positions.
+"""
+import random
+import time
+from typing import TYPE_CHECKING, List, Optional, Sequence, Union
+
+import numpy as np
+
+from bitboard import (
+    TOTAL_FILES, RANKS, SQUARES, WHITE, BLACK, PAWN, KNIGHT, BISHOP, ROOK, QUEEN,
+    Position, bits, does_tile_exist, square, tile
+)
+from attacks import ALL_DIRECTIONS, DIAGONAL, ORTHOGONAL, RAYS, KNIGHT_ATTACKS, KING_ATTACKS, slider_attacks
+from engine import PIECE_VALUES
+from movegen import generate_legal_moves
+
+if TYPE_CHECKING:
+    from circle_chess import ChesssBoard
+
+# points per square a piece can move to
+MOBILITY = (0, 4, 3, 2, 1, 0)
+
+
+def _ray_length(sq: int, directions) -> int:
+    return sum(len(RAYS[d][sq]) for d in directions)
+
+
+def _piece_square_table(kind: int, sq: int) -> int:
+    """
+    The board has no files at the edge, only the inner and outer rank and the missing
+    tiles. Pieces are worth more where they reach more tiles on an empty board.
+    Both colors move their pawns towards rank 0, so the tables are the same for both.
+    """
+    file, rank = tile(sq)
+    if not does_tile_exist(file, rank):
+        return 0
+    if kind == PAWN:
+        return (RANKS - 2 - rank) * 8
+    elif kind == KNIGHT:
+        return (bin(KNIGHT_ATTACKS[sq]).count("1") - 8) * 5
+    elif kind == BISHOP:
+        return (_ray_length(sq, DIAGONAL) - 14) * 2
+    elif kind == ROOK:
+        return _ray_length(sq, ORTHOGONAL) - 30
+    elif kind == QUEEN:
+        return (_ray_length(sq, ALL_DIRECTIONS) - 44) // 2
+    # the king is safest with few neighbours on the outer rank
+    return (8 - bin(KING_ATTACKS[sq]).count("1")) * 5
+
+
+PIECE_SQUARE_TABLES = [[_piece_square_table(kind, sq) for sq in range(SQUARES)] for kind in range(6)]
+# material and piece-square table of every piece from the view of white
+_PIECE_TABLES = [
+    [(1 if p < 6 else -1) * (PIECE_VALUES[p % 6] + PIECE_SQUARE_TABLES[p % 6][sq]) for sq in range(SQUARES)]
+    for p in range(12)
+]
+
+
+# the square of every tile in the order of the planes: file * 8 + rank
+_PLANE_SQUARES = [square(file, rank) for file in range(TOTAL_FILES) for rank in range(RANKS)]
+
+
+def evaluate(board: Union[Position, "ChesssBoard"]) -> int:
+    """the score of a ``Position`` or ``ChesssBoard`` from the view of the player to move"""
+    position = getattr(board, "position", board)
+    mailbox = position.mailbox
+    occupied = position.occupied
+    score = 0
+    for color, sign in ((WHITE, 1), (BLACK, -1)):
+        own = position.colors[color]
+        for sq in bits(own):
+            p = mailbox[sq]
+            score += _PIECE_TABLES[p][sq]
+            kind = p % 6
+            if kind == KNIGHT:
+                score += sign * MOBILITY[KNIGHT] * (KNIGHT_ATTACKS[sq] & ~own).bit_count()
+            elif BISHOP <= kind <= QUEEN:
+                directions = DIAGONAL if kind == BISHOP else ORTHOGONAL if kind == ROOK else ALL_DIRECTIONS
+                score += sign * MOBILITY[kind] * (slider_attacks(sq, occupied, directions) & ~own).bit_count()
+    return score if position.turn == WHITE else -score
+
+
+def to_planes(board: Union[Position, "ChesssBoard"]) -> np.ndarray:
+    """the ``(12, 24, 8)`` piece planes of a ``Position`` or ``ChesssBoard``"""
+    return stack_planes([board])[0]
+
+
+def stack_planes(boards: Sequence[Union[Position, "ChesssBoard"]]) -> np.ndarray:
+    """the ``(N, 12, 24, 8)`` piece planes of many boards"""
+    mailboxes = np.array([getattr(board, "position", board).mailbox for board in boards], np.int8)
+    # squares are rank * 24 + file, planes file * 8 + rank
+    mailboxes = mailboxes[:, _PLANE_SQUARES]
+    planes = mailboxes[:, np.newaxis, :] == np.arange(12, dtype=np.int8)[np.newaxis, :, np.newaxis]
+    return planes.view(np.uint8).reshape(len(boards), 12, TOTAL_FILES, RANKS)
+
+
+def _ray_table(directions) -> np.ndarray:
+    """``table[sq, i]`` are the squares of the ray in the i-th direction, padded with at least one ``SQUARES`` (no tile)"""
+    length = max(len(RAYS[d][sq]) for d in directions for sq in range(SQUARES)) + 1
+    table = np.full((SQUARES, len(directions), length), SQUARES, np.intp)
+    for sq in range(SQUARES):
+        for i, d in enumerate(directions):
+            table[sq, i, :len(RAYS[d][sq])] = RAYS[d][sq]
+    return table
+
+
+# the tables below use the order of the planes
+_TO_PLANE = np.append(np.argsort(_PLANE_SQUARES), SQUARES)
+_ORTHOGONAL_RAYS = _TO_PLANE[_ray_table(ORTHOGONAL)[_PLANE_SQUARES]]
+_DIAGONAL_RAYS = _TO_PLANE[_ray_table(DIAGONAL)[_PLANE_SQUARES]]
+_EXISTING = np.array([does_tile_exist(*tile(sq)) for sq in _PLANE_SQUARES])
+_KNIGHT_MATRIX = np.array(
+    [[KNIGHT_ATTACKS[sq] >> target & 1 for target in _PLANE_SQUARES] for sq in _PLANE_SQUARES], np.float32
+)
+_TABLES = np.array(_PIECE_TABLES, np.float32)[:, _PLANE_SQUARES].reshape(-1)
+# piece + 1 of the planes, a mailbox of the batch is the planes times these
+_PLANE_CODES = np.arange(1, 13, dtype=np.uint8)
+_IS_SLIDER = np.array([False] + [BISHOP <= p % 6 <= QUEEN for p in range(12)])
+
+
+def _reach(cells: np.ndarray, boards: np.ndarray, squares: np.ndarray, colors: np.ndarray, rays: np.ndarray) -> np.ndarray:
+    """
+    The number of tiles each slider reaches along every ray: the empty tiles up to the
+    first piece, plus that piece if it is an opponent. ``cells`` are 0 for missing
+    tiles, 1 and 2 for white and black pieces and 3 for empty tiles in plane order,
+    with a last column for no tile; the sliders stand on ``squares`` of ``boards``.
+    """
+    lines = cells[boards[:, np.newaxis, np.newaxis], rays[squares]]
+    first = (lines != 3).argmax(axis=2)
+    blocker = np.take_along_axis(lines, first[:, :, np.newaxis], axis=2)[:, :, 0]
+    return first + (blocker == 2 - colors[:, np.newaxis])
+
+
+def evaluate_batch(planes: np.ndarray, turns: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    The scores of a stack of ``(N, 12, 24, 8)`` piece planes from the view of white,
+    or of the player to move if ``turns`` (0 white, 1 black) are given. From about
+    100 positions on this evaluates some 80k positions/s, 4 times as many as
+    ``evaluate`` in a loop; single positions are faster with ``evaluate``.
+    """
+    n = planes.shape[0]
+    pieces = planes.reshape(n, 12, SQUARES)
+    score = pieces.reshape(n, -1).astype(np.float32) @ _TABLES
+
+    # 0 for empty tiles, piece + 1 otherwise
+    mailboxes = np.einsum("npq,p->nq", pieces, _PLANE_CODES)
+    black = (mailboxes > 6).view(np.int8)
+    white = (mailboxes != 0).view(np.int8) - black
+    for color, own, sign in ((0, white, 1), (6, black, -1)):
+        knights = pieces[:, color + KNIGHT].astype(np.float32) @ _KNIGHT_MATRIX
+        score += sign * MOBILITY[KNIGHT] * (knights * (1 - own)).sum(axis=1)
+
+    cells = np.zeros((n, SQUARES + 1), np.int8)
+    cells[:, :SQUARES] = _EXISTING * 3 - 2 * white - black
+
+    # every slider of every board, the kind decides which rays count
+    boards, squares = np.nonzero(_IS_SLIDER[mailboxes])
+    p = mailboxes[boards, squares].astype(np.intp) - 1
+    kinds, colors = p % 6, p // 6
+    mobility = np.zeros(len(boards), np.int32)
+
+    orthogonal = kinds != BISHOP
+    reach = _reach(cells, boards[orthogonal], squares[orthogonal], colors[orthogonal], _ORTHOGONAL_RAYS)
+    # both ways around a rank may meet, each tile counts once
+    mobility[orthogonal] += np.minimum(reach[:, 0] + reach[:, 1], TOTAL_FILES - 1) + reach[:, 2] + reach[:, 3]
+    diagonal = kinds != ROOK
+    mobility[diagonal] += _reach(cells, boards[diagonal], squares[diagonal], colors[diagonal], _DIAGONAL_RAYS).sum(axis=1)
+
+    weights = np.take(MOBILITY, kinds) * (1 - 2 * colors)
+    score += np.bincount(boards, weights * mobility, minlength=n)
+
+    score = score.round().astype(np.int32)
+    if turns is not None:
+        score = np.where(np.asarray(turns) == 0, score, -score)
+    return score
+
+
+def random_positions(count: int, seed: int = 0, max_plies: int = 80) -> List[Position]:
+    """positions of random games"""
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < count:
+        position = Position.initial()
+        for _ in range(rng.randrange(max_plies)):
+            moves = generate_legal_moves(position)
+            if not moves:
+                break
+            position.make_move(rng.choice(moves))
+        positions.append(position)
+    return positions
+
+
+def main():
+    positions = random_positions(1000)
+    start = time.perf_counter()
+    for position in positions:
+        evaluate(position)
+    print("evaluate: %i positions/s" % (len(positions) / (time.perf_counter() - start)))
+
+    start = time.perf_counter()
+    planes = stack_planes(positions)
+    print("stack_planes: %i positions/s" % (len(positions) / (time.perf_counter() - start)))
+
+    for size in (1, 10, 100, 1000, 10000):
+        batch = np.resize(planes, (size,) + planes.shape[1:])
+        runs = max(1, 10000 // size)
+        start = time.perf_counter()
+        for _ in range(runs):
+            evaluate_batch(batch)
+        elapsed = time.perf_counter() - start
+        print("evaluate_batch(%i): %i positions/s" % (size, size * runs / elapsed))
+
+
+if __name__ == "__main__":
+    main()
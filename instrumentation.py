@@ -0,0 +1,151 @@
+"""
+Counters and timers of the hot paths of the rules, for boards that opt in.
+
+    board = InstrumentedChesssBoard()
+    ... play as with ChesssBoard ...
+    board.metrics.snapshot()            # {"move_path": {"rook": {"count": 12, "seconds": 0.0004}}, ...}
+    board.metrics.to_prometheus()       # text exposition format for a metrics endpoint
+
+Several boards can share one ``Metrics``. Plain ``ChesssBoard`` objects are not
+touched, they pay nothing for this.
+
+    python instrumentation.py [games]
+
+plays random games on an instrumented board, prints the metrics and the overhead.
+"""
+import random
+import sys
+import time
+from typing import Dict, List, Optional, Tuple, Type
+
+from bitboard import move_start, move_target, tile
+from circle_chess import FIGURE_TYPES, ChesssBoard, Figure, GameState
+from movegen import generate_legal_moves
+
+# help texts of the metrics, by name
+METRICS = {
+    "move_path": "Figure.move_path calls by piece type",
+    "figure_mapping": "rebuilds of the figures of a board after a move",
+    "check_scan": "ChesssBoard.check_checkmate calls",
+    "move": "moves applied with ChesssBoard.make_move, check scan included",
+}
+
+
+class Metrics():
+    """a count and the seconds spent of every metric, by label"""
+
+    def __init__(self):
+        self.counts: Dict[Tuple[str, str], int] = {}
+        self.seconds: Dict[Tuple[str, str], float] = {}
+
+    def add(self, name: str, seconds: float, label: str = ""):
+        key = (name, label)
+        self.counts[key] = self.counts.get(key, 0) + 1
+        self.seconds[key] = self.seconds.get(key, 0.0) + seconds
+
+    def clear(self):
+        self.counts.clear()
+        self.seconds.clear()
+
+    def snapshot(self) -> Dict[str, Dict[str, Dict[str, float]]]:
+        """``{name: {label: {"count": ..., "seconds": ...}}}``, the label is "" for metrics without one"""
+        snapshot: Dict[str, Dict[str, Dict[str, float]]] = {}
+        for (name, label), count in sorted(self.counts.items()):
+            snapshot.setdefault(name, {})[label] = {"count": count, "seconds": self.seconds[name, label]}
+        return snapshot
+
+    def to_prometheus(self, prefix: str = "circle_chess") -> str:
+        """every metric as a ``_total`` and a ``_seconds_total`` counter"""
+        lines: List[str] = []
+        for name, labels in self.snapshot().items():
+            for suffix, field, unit in (("_total", "count", ""), ("_seconds_total", "seconds", ", seconds")):
+                metric = "%s_%s%s" % (prefix, name, suffix)
+                lines.append("# HELP %s %s%s" % (metric, METRICS.get(name, name), unit))
+                lines.append("# TYPE %s counter" % metric)
+                for label, values in labels.items():
+                    selector = '{piece="%s"}' % label if label else ""
+                    lines.append("%s%s %s" % (metric, selector, repr(values[field])))
+        return "\n".join(lines) + "\n"
+
+
+def _timed_figure(figure_type: Type[Figure]) -> Type[Figure]:
+    """``figure_type`` with a ``move_path`` counted in the ``metrics`` of the figure"""
+    label = figure_type.__name__.lower()
+
+    def move_path(self, new_pos, opponents_figures, my_figures):
+        start = time.perf_counter()
+        path = figure_type.move_path(self, new_pos, opponents_figures, my_figures)
+        self.metrics.add("move_path", time.perf_counter() - start, label)
+        return path
+
+    return type(figure_type.__name__, (figure_type,), {"move_path": move_path, "metrics": None})
+
+
+TIMED_FIGURE_TYPES = tuple(_timed_figure(figure_type) for figure_type in FIGURE_TYPES)
+
+
+class InstrumentedChesssBoard(ChesssBoard):
+    """a ``ChesssBoard`` that counts its work in ``metrics``"""
+
+    def __init__(self, metrics: Optional[Metrics] = None):
+        ChesssBoard.__init__(self)
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.figure_types = TIMED_FIGURE_TYPES
+
+    def _figures(self):
+        if self._views is not None:
+            return self._views
+        start = time.perf_counter()
+        views = ChesssBoard._figures(self)
+        for figure in views:
+            if figure is not None:
+                figure.metrics = self.metrics
+        self.metrics.add("figure_mapping", time.perf_counter() - start)
+        return views
+
+    def make_move(self, move: int):
+        start = time.perf_counter()
+        ChesssBoard.make_move(self, move)
+        self.metrics.add("move", time.perf_counter() - start)
+
+    def check_checkmate(self):
+        start = time.perf_counter()
+        ChesssBoard.check_checkmate(self)
+        self.metrics.add("check_scan", time.perf_counter() - start)
+
+
+def _play(board: ChesssBoard, moves: List[int]) -> float:
+    """seconds to play ``moves`` with ``move_piece``, asking every white figure for a path before each"""
+    start = time.perf_counter()
+    for move in moves:
+        target = tile(move_target(move))
+        for figure in board.white_pieces:
+            figure.move_path(target, board.black_pieces, board.white_pieces)
+        board.move_piece(tile(move_start(move)), target)
+    return time.perf_counter() - start
+
+
+def main():
+    games = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    rng = random.Random(0)
+    scripts = []
+    for _ in range(games):
+        board = ChesssBoard()
+        moves = []
+        while board.state is not GameState.DONE and len(moves) < 100:
+            legal = generate_legal_moves(board.position)
+            if not legal:
+                break
+            moves.append(rng.choice(legal))
+            board.make_move(moves[-1])
+        scripts.append(moves)
+
+    metrics = Metrics()
+    plain = sum(_play(ChesssBoard(), moves) for moves in scripts)
+    instrumented = sum(_play(InstrumentedChesssBoard(metrics), moves) for moves in scripts)
+    print(metrics.to_prometheus(), end="")
+    print("# %i games: %.3fs plain, %.3fs instrumented (%+.0f%%)" % (games, plain, instrumented, 100 * (instrumented / plain - 1)))
+
+
+if __name__ == "__main__":
+    main()
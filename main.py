@@ -1,9 +1,20 @@
 # -*- coding: utf-8 -*-
+import logging
 import math
-from typing import Optional, Tuple
+import os
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+import numpy as np
 import pygame
-from polar_coordinate import PolarCoordinate
+from polar_coordinate import PolarArray, PolarCoordinate
 from circle_chess import ChesssBoard, GameState, FILES, RANKS, does_tile_exist
+from bitboard import TOTAL_FILES, move_start, move_target, tile
+from book import OpeningBook
+from analysis import AnalysisWorker
+from engine import SearchInfo
+
+logger = logging.getLogger(__name__)
 
 
 BACKGROUND = [235]*3 # [147,209,255]
@@ -17,13 +28,144 @@ FILE_ANGLE = math.pi / FILES
 
 TITLE_SCREEN_TEXT = "Welcome to circular Chess!!"
 
+# the loops sleep until the next event; with the frame overlay shown they wake up
+# this often so events per second fall back to 0 when nothing happens
+OVERLAY_REFRESH_MS = 500
+OVERLAY_KEY = pygame.K_F3
+
+# the engine analyzes the position in a background process while analysis is on,
+# the loops check for its results this often
+ANALYSIS_KEY = pygame.K_a
+ANALYSIS_POLL_MS = 100
+# moves of the principal variation that are highlighted
+PV_MOVES = 2
+
 
 COLOR_CHECKED = pygame.Color(255, 0, 0)
 COLOR_MOUSEOVER = pygame.Color(120, 120, 255)
+COLOR_BOOK_MOVE = pygame.Color(90, 170, 90)
+COLOR_PV = pygame.Color(230, 200, 60)
 COLOR_SELECTED_PIECE = pygame.Color(0, 0, 255)
 COLOR_LIGHT_SQUARE = pygame.Color(209, 153, 100)
 COLOR_DARK_SQUARE = pygame.Color(88, 42, 0)
 
+PIECES_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pieces")
+# the opening book shown in the game, built with book.py
+BOOK_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "book.ccob")
+
+PIECE_IMAGES = {
+    "q": "wQueen.png",
+    "Q": "bQueen.png",
+    "k": "wKing.png",
+    "K": "bKing.png",
+    "r": "wRook.png",
+    "R": "bRook.png",
+    "b": "wBishop.png",
+    "B": "bBishop.png",
+    "n": "wKnight.png",
+    "N": "bKnight.png",
+    "p": "wPawn.png",
+    "P": "bPawn.png",
+}
+
+class PieceAtlas():
+    """
+    All piece images side by side on one surface, converted once. Scaled copies are
+    made for the whole atlas at once and cached per sprite size; only the most
+    recently used ``max_sizes`` sizes are kept (the window is not resized often).
+    """
+
+    def __init__(self, directory: str = PIECES_DIRECTORY, max_sizes: int = 2):
+        images = {label: pygame.image.load(os.path.join(directory, name)) for label, name in PIECE_IMAGES.items()}
+        self.cell = max(max(image.get_size()) for image in images.values())
+        self.labels = list(images)
+        self.surface = pygame.Surface((self.cell * len(images), self.cell), pygame.SRCALPHA)
+        for i, image in enumerate(images.values()):
+            self.surface.blit(pygame.transform.scale(image, (self.cell, self.cell)), (i * self.cell, 0))
+        self.surface = self.surface.convert_alpha()
+        self.max_sizes = max_sizes
+        self._scaled: Dict[int, Dict[str, pygame.Surface]] = {}
+
+    def sprites(self, size: int) -> Dict[str, pygame.Surface]:
+        sprites = self._scaled.pop(size, None)
+        if sprites is None:
+            scaled = pygame.transform.scale(self.surface, (size * len(self.labels), size))
+            sprites = {label: scaled.subsurface((i * size, 0, size, size)) for i, label in enumerate(self.labels)}
+            while len(self._scaled) >= self.max_sizes:
+                del self._scaled[next(iter(self._scaled))]
+        self._scaled[size] = sprites    # (re)inserted last: most recently used
+        return sprites
+
+    def sprite(self, label: str, size: int) -> pygame.Surface:
+        return self.sprites(size)[label]
+
+
+# created on first use, the display has to exist for convert_alpha
+_atlas: Optional[PieceAtlas] = None
+
+
+def piece_atlas() -> PieceAtlas:
+    global _atlas
+    if _atlas is None:
+        _atlas = PieceAtlas()
+    return _atlas
+
+
+class FrameStats():
+    """
+    Time and draw calls (arcs and blits) of the last frame and the events of the last
+    second, shown in the top left corner while ``visible``.
+    """
+
+    def __init__(self):
+        self.visible = False
+        self.draw_calls = 0
+        self.frame_draw_calls = 0
+        self.frame_ms = 0.0
+        self.frames = 0
+        self._start = 0.0
+        self._events: Deque[float] = deque()
+        self._font: Optional[pygame.font.Font] = None
+        self.rect: Optional[pygame.Rect] = None
+
+    def count_events(self, count: int):
+        self._events.extend([time.perf_counter()] * count)
+        self.events_per_second()    # forget the old ones
+
+    def events_per_second(self) -> int:
+        now = time.perf_counter()
+        while self._events and self._events[0] < now - 1:
+            self._events.popleft()
+        return len(self._events)
+
+    def begin_frame(self):
+        self._start = time.perf_counter()
+        self.draw_calls = 0
+
+    def end_frame(self):
+        self.frame_ms = 1000 * (time.perf_counter() - self._start)
+        self.frame_draw_calls = self.draw_calls
+        self.frames += 1
+
+    def text(self) -> str:
+        return "frame %.1f ms, %i draw calls, %i events/s" % (self.frame_ms, self.frame_draw_calls, self.events_per_second())
+
+    def draw(self, screen: pygame.Surface, restore: Callable[[pygame.Rect], None]) -> pygame.Rect:
+        """
+        Draws the overlay and returns the area to update, including where it was before;
+        ``restore`` redraws what the screen shows in that old area without the overlay.
+        """
+        if self._font is None:
+            self._font = pygame.font.Font(pygame.font.get_default_font(), 14)
+        old = self.rect
+        if old is not None:
+            restore(old)
+        self.rect = screen.blit(self._font.render(self.text(), True, (0, 0, 0), BACKGROUND), (4, 4))
+        return self.rect if old is None else self.rect.union(old)
+
+
+frame_stats = FrameStats()
+
 
 def pygame_coor_to_polar(screen: pygame.Surface, x: int, y: int, scale=1) -> PolarCoordinate:
     width, height = screen.get_size()
@@ -33,29 +175,74 @@ def pygame_coor_to_polar(screen: pygame.Surface, x: int, y: int, scale=1) -> Pol
 def tile_height(screen: pygame.Surface):
     return (screen.get_height() // 2) / (RANKS + BOARD_CENTER_OFFSET / RANK_SIZE)
 
-def draw_board(screen: pygame.Surface, highlight: Optional[Tuple[int, int]], selected: Optional[Tuple[int, int]] = None, check_field = None):
+def draw_tile(screen: pygame.Surface, pos: Tuple[int, int], color):
     center_x, center_y = screen.get_size()
     center_x //= 2
     center_y //= 2
-    
-    for file in range(0, 2 * FILES):
-        for rank in range(RANKS):
-            if not does_tile_exist(file, rank):
-                continue
-            radius_in = rank * tile_height(screen) + BOARD_CENTER_OFFSET
-            radius_out = (rank + 1) * tile_height(screen) + BOARD_CENTER_OFFSET
-
-            if check_field is not None and (file, rank) == check_field:
-                color = COLOR_CHECKED
-            elif selected is not None and (file, rank) == selected:
-                color = COLOR_SELECTED_PIECE
-            elif highlight is not None and (file, rank) == highlight:
-                color = COLOR_MOUSEOVER
-            else:
-                color = COLOR_LIGHT_SQUARE if file % 2 == rank % 2 else COLOR_DARK_SQUARE
-
-            for radius in range(int(radius_in), int(radius_out)):
-                pygame.draw.arc(screen, color, [center_x - radius, center_y - radius, 2 * radius, 2 * radius], file * FILE_ANGLE, (file + 1) * FILE_ANGLE)
+    file, rank = pos
+    radius_in = rank * tile_height(screen) + BOARD_CENTER_OFFSET
+    radius_out = (rank + 1) * tile_height(screen) + BOARD_CENTER_OFFSET
+
+    frame_stats.draw_calls += int(radius_out) - int(radius_in)
+    for radius in range(int(radius_in), int(radius_out)):
+        pygame.draw.arc(screen, color, [center_x - radius, center_y - radius, 2 * radius, 2 * radius], file * FILE_ANGLE, (file + 1) * FILE_ANGLE)
+
+
+def tile_rect(screen: pygame.Surface, pos: Tuple[int, int]) -> pygame.Rect:
+    """screen area covered by a tile and the piece standing on it"""
+    center_x, center_y = screen.get_size()
+    center_x //= 2
+    center_y //= 2
+    file, rank = pos
+    th = tile_height(screen)
+    points = []
+    for radius in (rank * th + BOARD_CENTER_OFFSET, (rank + 1) * th + BOARD_CENTER_OFFSET):
+        for step in range(5):
+            angle = (file + step / 4) * FILE_ANGLE
+            points.append((center_x + radius * math.cos(angle), center_y - radius * math.sin(angle)))
+
+    xs = [x for x, _ in points]
+    ys = [y for _, y in points]
+    rect = pygame.Rect(int(min(xs)), int(min(ys)), int(max(xs) - min(xs)) + 1, int(max(ys) - min(ys)) + 1)
+    # pieces are th x th sprites centered in the tile and may stick out of it
+    return rect.inflate(int(th) + 4, int(th) + 4)
+
+
+# the board without highlights, rendered once per window size
+_board_cache = {}
+
+
+def invalidate_board_cache():
+    _board_cache.clear()
+
+
+def board_background(screen: pygame.Surface) -> pygame.Surface:
+    size = screen.get_size()
+    background = _board_cache.get(size)
+    if background is None:
+        invalidate_board_cache()
+        background = pygame.Surface(size).convert()
+        background.fill(BACKGROUND)
+        for file in range(0, 2 * FILES):
+            for rank in range(RANKS):
+                if does_tile_exist(file, rank):
+                    draw_tile(background, (file, rank), COLOR_LIGHT_SQUARE if file % 2 == rank % 2 else COLOR_DARK_SQUARE)
+        _board_cache[size] = background
+    return background
+
+
+def draw_board(screen: pygame.Surface, highlight: Optional[Tuple[int, int]], selected: Optional[Tuple[int, int]] = None, check_field = None, hints = (), pv = ()):
+    screen.blit(board_background(screen), (0, 0))
+    frame_stats.draw_calls += 1
+
+    for pv_tile in pv:
+        draw_tile(screen, pv_tile, COLOR_PV)
+    for hint in hints:
+        draw_tile(screen, hint, COLOR_BOOK_MOVE)
+    # later highlights win, same priority as before: check, selection, mouse over
+    for highlighted, color in ((highlight, COLOR_MOUSEOVER), (selected, COLOR_SELECTED_PIECE), (check_field, COLOR_CHECKED)):
+        if highlighted is not None:
+            draw_tile(screen, highlighted, color)
 
 def polar_to_tile(polar: PolarCoordinate, screen: pygame.Surface, scale=RANK_SIZE, offset=BOARD_CENTER_OFFSET, angle_section=FILE_ANGLE) -> Optional[Tuple[int, int]]:
     if polar.r < offset or polar.r > 2 * RANKS * tile_height(screen):
@@ -68,8 +255,36 @@ def polar_to_tile(polar: PolarCoordinate, screen: pygame.Surface, scale=RANK_SIZ
         return None
     return res
 
-def tile_to_polar(tile: Tuple[int, int], screen: pygame.Surface) -> PolarCoordinate:
-    file, rank = tile
+# hit_test_map(screen)[x, y] is the square index of the tile under the pixel or -1
+_hit_test_cache = {}
+
+def hit_test_map(screen: pygame.Surface) -> np.ndarray:
+    """polar_to_tile for every pixel of the screen at once; computed once per window size"""
+    size = screen.get_size()
+    grid = _hit_test_cache.get(size)
+    if grid is None:
+        _hit_test_cache.clear()
+        width, height = size
+        x = np.arange(width)[:, np.newaxis] - width // 2
+        y = np.arange(height)[np.newaxis, :] - height // 2
+        x, y = np.broadcast_arrays(x, y)
+        files, ranks = PolarArray.from_cartesian(x, y).to_tiles(tile_height(screen), BOARD_CENTER_OFFSET)
+        grid = np.where(files == -1, -1, ranks * TOTAL_FILES + files).astype(np.int16)
+        _hit_test_cache[size] = grid
+    return grid
+
+
+def tile_at(screen: pygame.Surface, pos: Tuple[int, int]) -> Optional[Tuple[int, int]]:
+    grid = hit_test_map(screen)
+    x, y = pos
+    if not 0 <= x < grid.shape[0] or not 0 <= y < grid.shape[1]:
+        return None
+    sq = int(grid[x, y])
+    return None if sq == -1 else tile(sq)
+
+
+def tile_to_polar(pos: Tuple[int, int], screen: pygame.Surface) -> PolarCoordinate:
+    file, rank = pos
     t_height = tile_height(screen)
     coordinate = PolarCoordinate(
         rank * t_height + BOARD_CENTER_OFFSET,
@@ -81,13 +296,14 @@ def tile_to_polar(tile: Tuple[int, int], screen: pygame.Surface) -> PolarCoordin
     
 def draw_pieces(screen: pygame.Surface, game: ChesssBoard):
     th = tile_height(screen)
-    for p in game.white_pieces + game.black_pieces:
-        coordinate = tile_to_polar(p.pos, screen)
-        coordinate.r += 0.5 * th
-        pyx, pyy = coordinate.to_cartesian(screen)
-
-        surface = p.surface
-        surface = pygame.transform.scale(surface, (th, th))
+    sprites = piece_atlas().sprites(int(th))
+    figures = game.white_pieces + game.black_pieces
+    coordinates = PolarArray.from_tiles([p.pos[0] for p in figures], [p.pos[1] for p in figures], th, BOARD_CENTER_OFFSET)
+    coordinates.r += 0.5 * th
+    xs, ys = coordinates.to_cartesian(screen)
+    frame_stats.draw_calls += len(figures)
+    for p, pyx, pyy in zip(figures, xs.tolist(), ys.tolist()):
+        surface = sprites[p.label]
 
         pyx -= surface.get_width() // 2
         pyy -= surface.get_height() // 2
@@ -95,53 +311,158 @@ def draw_pieces(screen: pygame.Surface, game: ChesssBoard):
         screen.blit(surface, (pyx, pyy))
 
 
+def wait_events(timeout: Optional[int] = None) -> List[pygame.event.Event]:
+    """sleeps until there is an event or ``timeout`` ms passed, then returns all queued events"""
+    first = pygame.event.wait() if timeout is None else pygame.event.wait(timeout)
+    events = [] if first.type == pygame.NOEVENT else [first]
+    events.extend(pygame.event.get())
+    frame_stats.count_events(len(events))
+    return events
+
+
+def wait_timeout(analysis: Optional[AnalysisWorker] = None) -> Optional[int]:
+    timeouts = [OVERLAY_REFRESH_MS if frame_stats.visible else None, None if analysis is None or analysis.done else ANALYSIS_POLL_MS]
+    return min((timeout for timeout in timeouts if timeout is not None), default=None)
+
+
+def toggle_overlay():
+    frame_stats.visible = not frame_stats.visible
+    frame_stats.rect = None
+
+
+def pv_tiles(info: Optional[SearchInfo]) -> Tuple[Tuple[int, int], ...]:
+    """start and target tiles of the first moves of a principal variation"""
+    if info is None:
+        return ()
+    return tuple(tile(sq) for move in info.pv[:PV_MOVES] for sq in (move_start(move), move_target(move)))
+
+
+def book_hints(game: ChesssBoard, book: Optional[OpeningBook]) -> Tuple[Tuple[int, int], ...]:
+    """start and target tile of the most played book move"""
+    if book is None:
+        return ()
+    move = book.choose(game.position)
+    if move is None:
+        return ()
+    return tile(move_start(move)), tile(move_target(move))
+
+
 def circle_chess(screen: pygame.Surface):
     winner = None 
     state = GameState.RUNNING
 
-    clock = pygame.time.Clock()
+    book = OpeningBook(BOOK_PATH) if os.path.exists(BOOK_PATH) else None
 
     cursor_hover = None
 
     game = ChesssBoard()
     selected = None
+    hints = book_hints(game, book)
+    analysis: Optional[AnalysisWorker] = None
+    pv = ()
+
+    # the loop sleeps until something happens; the whole screen is redrawn only when
+    # the position or the window changed, otherwise just the tiles whose highlight changed
+    redraw_all = True
+    dirty_tiles = set()
+
+    def redraw_area(rect: pygame.Rect):
+        screen.set_clip(rect)
+        draw_board(screen, cursor_hover, selected, check_field=game.checked, hints=hints, pv=pv)
+        draw_pieces(screen, game)
+        screen.set_clip(None)
 
     while state is GameState.RUNNING:
-        screen.fill(BACKGROUND)
-        for e in pygame.event.get():
+        for e in wait_events(wait_timeout(analysis)):
             if e.type == pygame.QUIT:
                 state = GameState.CANCELED
+            elif e.type == pygame.VIDEORESIZE:
+                invalidate_board_cache()
+                _hit_test_cache.clear()
+                redraw_all = True
+            elif e.type == pygame.VIDEOEXPOSE:
+                # same size, the cached board and hit-test map are still good
+                redraw_all = True
+            elif e.type == pygame.KEYDOWN and e.key == OVERLAY_KEY:
+                toggle_overlay()
+                redraw_all = True
+            elif e.type == pygame.KEYDOWN and e.key == ANALYSIS_KEY:
+                if analysis is None:
+                    analysis = AnalysisWorker()
+                    analysis.start(game.position)
+                else:
+                    analysis.close()
+                    analysis = None
+                    dirty_tiles.update(pv)
+                    pv = ()
+                    pygame.display.set_caption("")
             elif e.type == pygame.MOUSEMOTION:
                 mouse_position = e.pos
-                cursor_hover = polar_to_tile(pygame_coor_to_polar(screen, *mouse_position), screen)
+                hover = tile_at(screen, mouse_position)
+                if hover != cursor_hover:
+                    dirty_tiles.update((cursor_hover, hover))
+                    cursor_hover = hover
             
             elif e.type == pygame.MOUSEBUTTONDOWN and e.button == 1:
-                cursor_tile = polar_to_tile(pygame_coor_to_polar(screen, *e.pos), screen)
-                pieces = game.white_pieces if game.get_player() == ChesssBoard.WHITE_TURN else game.black_pieces
+                cursor_tile = tile_at(screen, e.pos)
 
-                for p in pieces:
-                    if p.pos == cursor_tile:
-                        selected = cursor_tile
-                        break
+                if cursor_tile is not None and game.is_own_piece(cursor_tile):
+                    dirty_tiles.update((selected, cursor_tile))
+                    selected = cursor_tile
                 else:
                     if selected is not None and cursor_tile is not None and selected != cursor_tile:
                         moved = game.move_piece(selected, cursor_tile)
                         if moved:
                             selected = None
+                            redraw_all = True
+                            hints = book_hints(game, book)
+                            pv = ()
+                            if analysis is not None and game.state is not GameState.DONE:
+                                analysis.start(game.position)
+                            if game.state is GameState.DONE:
+                                winner = game.winner
+                                logger.info("game over, winner: %s", "draw" if winner is None else "white" if winner == ChesssBoard.WHITE_TURN else "black")
                         else:
-                            print("Invalid move")
-        
-        draw_board(screen, cursor_hover, selected, check_field=game.checked)
-        draw_pieces(screen, game)
+                            logger.info("invalid move %s -> %s", selected, cursor_tile)
 
-        pygame.display.update()
-
-        clock.tick(60)
-    
+        if analysis is not None and analysis.poll() and analysis.best is not None:
+            new_pv = pv_tiles(analysis.best)
+            dirty_tiles.update(pv + new_pv)
+            pv = new_pv
+            pygame.display.set_caption("depth %i, score %+.2f" % (analysis.best.depth, analysis.best.score / 100))
+        
+        dirty_tiles.discard(None)
+        rects: List[pygame.Rect] = []
+        if redraw_all:
+            frame_stats.begin_frame()
+            draw_board(screen, cursor_hover, selected, check_field=game.checked, hints=hints, pv=pv)
+            draw_pieces(screen, game)
+            frame_stats.end_frame()
+        elif dirty_tiles:
+            frame_stats.begin_frame()
+            rects = [tile_rect(screen, dirty) for dirty in dirty_tiles]
+            for rect in rects:
+                redraw_area(rect)
+            frame_stats.end_frame()
+
+        if frame_stats.visible:
+            rects.append(frame_stats.draw(screen, redraw_area))
+        if redraw_all:
+            pygame.display.flip()
+        elif rects:
+            pygame.display.update(rects)
+
+        redraw_all = False
+        dirty_tiles.clear()
+
+    if analysis is not None:
+        analysis.close()
     return winner
 
 
 def main():
+    # e.g. CIRCLE_CHESS_LOG=DEBUG shows every check
+    logging.basicConfig(level=os.environ.get("CIRCLE_CHESS_LOG", "INFO"), format="%(levelname)s %(name)s: %(message)s")
     pygame.init()
 
     screen = pygame.display.set_mode([800, 600], pygame.RESIZABLE)
@@ -154,23 +475,38 @@ def main():
     text = font_obj.render(TITLE_SCREEN_TEXT, True, [0, 0, 0])
     text_width, text_height = font_obj.size(TITLE_SCREEN_TEXT)
     
+    redraw = True
     while running:
-        screen.fill(BACKGROUND)
-        for event in pygame.event.get():
+        for event in wait_events(wait_timeout()):
             if event.type == pygame.QUIT:
                 running = False
 
-            elif event.type == pygame.MOUSEMOTION:
-                x, y = event.pos
+            elif event.type in (pygame.VIDEORESIZE, pygame.VIDEOEXPOSE):
+                redraw = True
+
+            elif event.type == pygame.KEYDOWN and event.key == OVERLAY_KEY:
+                toggle_overlay()
+                redraw = True
             
             elif event.type == pygame.KEYDOWN and event.key == pygame.K_SPACE:
                 # acutal game
                 circle_chess(screen)
-                ...
+                redraw = True
         
-        width, height = screen.get_size()
-        screen.blit(text, (width / 2 - text_width / 2, height - (height / (2 * text_height)) * text_height))
-        pygame.display.flip()
+        if redraw:
+            frame_stats.begin_frame()
+            screen.fill(BACKGROUND)
+            width, height = screen.get_size()
+            screen.blit(text, (width / 2 - text_width / 2, height - (height / (2 * text_height)) * text_height))
+            frame_stats.draw_calls += 2
+            frame_stats.end_frame()
+        if frame_stats.visible:
+            overlay = frame_stats.draw(screen, lambda rect: screen.fill(BACKGROUND, rect))
+            if not redraw:
+                pygame.display.update(overlay)
+        if redraw:
+            pygame.display.flip()
+        redraw = False
             
     pygame.quit()
 
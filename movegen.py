@@ -0,0 +1,251 @@
+"""
+Move generation for the bitboard position.
+
+    python movegen.py [depth]
+
+runs perft from the start position and compares it with the stored node counts.
+"""
+import sys
+import time
+from typing import List, Optional, TYPE_CHECKING
+
+from bitboard import (
+    TOTAL_FILES, RANKS, SQUARES, EMPTY, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, PROMOTION,
+    Position, bits, piece
+)
+from attacks import (
+    KNIGHT_ATTACKS, KING_ATTACKS, PAWN_ATTACKS, PAWN_ATTACKERS, PAWN_PUSHES,
+    ALL_DIRECTIONS, RAY_MASKS, first_blocker, rook_attacks, bishop_attacks, queen_attacks
+)
+
+if TYPE_CHECKING:
+    from attackmap import AttackMap
+
+# node counts of the start position, used to catch regressions of the move generator
+PERFT_RESULTS = {
+    1: 22,
+    2: 484,
+    3: 12738,
+    4: 334557,
+}
+
+_PROMOTION_SQUARES = (1 << TOTAL_FILES) - 1    # rank 0
+_DOUBLE_STEP_RANK = RANKS - 2
+
+
+def is_square_attacked(position: Position, sq: int, by: int, occupied: int = -1, exclude: int = 0) -> bool:
+    """
+    Whether a piece of color ``by`` attacks ``sq``. ``occupied`` and ``exclude``
+    (pieces of ``by`` which are gone, e.g. captured) allow asking this for the
+    position after a move without playing it.
+    """
+    if occupied == -1:
+        occupied = position.occupied
+    pieces = position.pieces
+    base = by * 6
+    keep = ~exclude
+    if KNIGHT_ATTACKS[sq] & pieces[base + KNIGHT] & keep:
+        return True
+    if PAWN_ATTACKERS[sq] & pieces[base + PAWN] & keep:
+        return True
+    if KING_ATTACKS[sq] & pieces[base + KING] & keep:
+        return True
+    queens = pieces[base + QUEEN]
+    rooks = (pieces[base + ROOK] | queens) & keep
+    if rooks and rook_attacks(sq, occupied) & rooks:
+        return True
+    bishops = (pieces[base + BISHOP] | queens) & keep
+    return bool(bishops and bishop_attacks(sq, occupied) & bishops)
+
+
+def in_check(position: Position, color: int) -> bool:
+    return is_square_attacked(position, position.king_square(color), 1 - color)
+
+
+def generate_moves(position: Position, captures_only: bool = False) -> List[int]:
+    """
+    All pseudo legal moves, they might leave the own king attacked. With
+    ``captures_only`` only captures and promotions are generated (quiescence search).
+    """
+    us = position.turn
+    pieces = position.pieces
+    occupied = position.occupied
+    enemy = position.colors[1 - us]
+    targets = enemy if captures_only else ~position.colors[us]
+    base = us * 6
+    moves = []
+    append = moves.append
+
+    for sq in bits(pieces[base + PAWN]):
+        step = PAWN_PUSHES[sq]
+        if step != -1 and not occupied >> step & 1 and (not captures_only or _PROMOTION_SQUARES >> step & 1):
+            append(sq | step << 8 | (PROMOTION if _PROMOTION_SQUARES >> step & 1 else 0))
+            if sq // TOTAL_FILES == _DOUBLE_STEP_RANK:
+                double = PAWN_PUSHES[step]
+                if not occupied >> double & 1:
+                    append(sq | double << 8)
+        for target in bits(PAWN_ATTACKS[sq] & enemy):
+            append(sq | target << 8 | (PROMOTION if _PROMOTION_SQUARES >> target & 1 else 0))
+
+    for sq in bits(pieces[base + KNIGHT]):
+        for target in bits(KNIGHT_ATTACKS[sq] & targets):
+            append(sq | target << 8)
+
+    for sq in bits(pieces[base + BISHOP]):
+        for target in bits(bishop_attacks(sq, occupied) & targets):
+            append(sq | target << 8)
+
+    for sq in bits(pieces[base + ROOK]):
+        for target in bits(rook_attacks(sq, occupied) & targets):
+            append(sq | target << 8)
+
+    for sq in bits(pieces[base + QUEEN]):
+        for target in bits(queen_attacks(sq, occupied) & targets):
+            append(sq | target << 8)
+
+    for sq in bits(pieces[base + KING]):
+        for target in bits(KING_ATTACKS[sq] & targets):
+            append(sq | target << 8)
+
+    return moves
+
+
+def is_pseudo_legal(position: Position, move: int) -> bool:
+    """whether ``generate_moves`` would generate ``move``; checks a single move quickly"""
+    us = position.turn
+    start = move & 0xFF
+    target = move >> 8 & 0xFF
+    if start >= SQUARES or target >= SQUARES or move >> 17:
+        return False
+    p = position.mailbox[start]
+    if p == EMPTY or p // 6 != us or position.colors[us] >> target & 1:
+        return False
+
+    kind = p % 6
+    occupied = position.occupied
+    if kind == PAWN:
+        if bool(move & PROMOTION) != bool(_PROMOTION_SQUARES >> target & 1):
+            return False
+        if PAWN_ATTACKS[start] >> target & 1:
+            return bool(position.colors[1 - us] >> target & 1)
+        step = PAWN_PUSHES[start]
+        if step == -1 or occupied >> step & 1:
+            return False
+        if target == step:
+            return True
+        return start // TOTAL_FILES == _DOUBLE_STEP_RANK and target == PAWN_PUSHES[step] and not occupied >> target & 1
+
+    if move & PROMOTION:
+        return False
+    if kind == KNIGHT:
+        attacks = KNIGHT_ATTACKS[start]
+    elif kind == KING:
+        attacks = KING_ATTACKS[start]
+    elif kind == BISHOP:
+        attacks = bishop_attacks(start, occupied)
+    elif kind == ROOK:
+        attacks = rook_attacks(start, occupied)
+    else:
+        attacks = queen_attacks(start, occupied)
+    return bool(attacks >> target & 1)
+
+
+def is_legal(position: Position, move: int) -> bool:
+    """whether the pseudo legal ``move`` keeps the own king safe"""
+    us = position.turn
+    start = move & 0xFF
+    target = move >> 8 & 0xFF
+    target_bit = 1 << target
+    occupied = position.occupied & ~(1 << start) | target_bit
+    king = target if position.mailbox[start] == piece(us, KING) else position.king_square(us)
+    return not is_square_attacked(position, king, 1 - us, occupied, target_bit)
+
+
+def pinned_pieces(position: Position, color: int) -> int:
+    """pieces of ``color`` which are the only piece between their king and an enemy slider"""
+    king = position.king_square(color)
+    occupied = position.occupied
+    own = position.colors[color]
+    pieces = position.pieces
+    base = (1 - color) * 6
+    queens = pieces[base + QUEEN]
+    orthogonal = pieces[base + ROOK] | queens
+    diagonal = pieces[base + BISHOP] | queens
+    pinned = 0
+    for d in ALL_DIRECTIONS:
+        ray = RAY_MASKS[d][king]
+        sliders = (orthogonal if d < 4 else diagonal) & ray
+        if not sliders:
+            continue
+        blockers = ray & occupied
+        b = first_blocker(d, king, blockers)
+        if not own >> b & 1:
+            continue
+        behind = blockers & ~(1 << b)
+        if behind and sliders >> first_blocker(d, king, behind) & 1:
+            pinned |= 1 << b
+    return pinned
+
+
+def generate_legal_moves(position: Position, attack_map: Optional["AttackMap"] = None) -> List[int]:
+    """
+    All legal moves. Unless the king is in check only king moves and moves of pinned
+    pieces need the full legality test; ``attack_map`` spares even that for king moves.
+    """
+    us = position.turn
+    king = position.king_square(us)
+    moves = generate_moves(position)
+    if attack_map is not None:
+        checked = attack_map.is_attacked(king, 1 - us)
+    else:
+        checked = is_square_attacked(position, king, 1 - us)
+    if checked:
+        return [move for move in moves if is_legal(position, move)]
+
+    pinned = pinned_pieces(position, us)
+    danger = attack_map.attacked(1 - us) if attack_map is not None else -1
+    legal = []
+    for move in moves:
+        start = move & 0xFF
+        if start == king:
+            if danger != -1:
+                if not danger >> (move >> 8 & 0xFF) & 1:
+                    legal.append(move)
+                continue
+        elif not pinned >> start & 1:
+            legal.append(move)
+            continue
+        if is_legal(position, move):
+            legal.append(move)
+    return legal
+
+
+def perft(position: Position, depth: int) -> int:
+    """number of leaf nodes of the legal move tree with the given depth"""
+    moves = generate_legal_moves(position)
+    if depth <= 1:
+        return len(moves) if depth == 1 else 1
+
+    nodes = 0
+    for move in moves:
+        position.make_move(move)
+        nodes += perft(position, depth - 1)
+        position.unmake_move()
+    return nodes
+
+
+def main():
+    max_depth = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    for depth in range(1, max_depth + 1):
+        start = time.perf_counter()
+        nodes = perft(Position.initial(), depth)
+        elapsed = time.perf_counter() - start
+        expected = PERFT_RESULTS.get(depth)
+        status = "" if expected is None else "ok" if expected == nodes else "MISMATCH (expected %i)" % expected
+        print("perft(%i) = %i in %.3fs, %i nodes/s %s" % (depth, nodes, elapsed, nodes / max(elapsed, 1e-9), status))
+        if expected is not None and expected != nodes:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+"""
+Notation and archive format for circular chess games.
+
+Squares are a file letter ``a`` - ``x`` (file 0 - 23) and the rank digit ``0`` - ``7``,
+moves are start and target square, e.g. ``o6o4``. Promotions get a trailing ``q``.
+
+Positions are written like FEN: the ranks from 7 to 0 separated by ``/``, each with
+the 24 files (white pieces lower case like the images, digits count empty or missing
+tiles), the player to move (``w``/``b``), the unmoved kings and rooks (``-`` if none)
+and the number of moves played.
+
+Archives are binary: the ``MAGIC`` header followed by the games, each being the number
+of moves (2 bytes), the result (1 byte) and 2 bytes per move (start * SQUARES + target).
+All games start from the initial setup.
+
+    python notation.py generate ARCHIVE GAMES
+    python notation.py replay ARCHIVE
+
+writes random games, or replays and validates an archive reporting games/s.
+"""
+import random
+import struct
+import sys
+import time
+from typing import BinaryIO, Iterable, Iterator, List, NamedTuple, Tuple
+
+from bitboard import (
+    TOTAL_FILES, RANKS, SQUARES, EMPTY, WHITE, BLACK, PAWN, ROOK, KING, PROMOTION, LABELS,
+    Position, bits, does_tile_exist, piece, square, tile, piece_kind
+)
+from movegen import generate_legal_moves, in_check, is_legal, is_pseudo_legal
+
+FILE_NAMES = "abcdefghijklmnopqrstuvwx"
+
+WHITE_WINS = "1-0"
+BLACK_WINS = "0-1"
+DRAW = "1/2-1/2"
+UNKNOWN = "*"
+RESULTS = (WHITE_WINS, BLACK_WINS, DRAW, UNKNOWN)
+
+MAGIC = b"CCG1"
+_GAME_HEADER = struct.Struct(">HB")
+
+
+class InvalidGame(ValueError):
+    pass
+
+
+class Game(NamedTuple):
+    moves: List[int]
+    result: str = UNKNOWN
+
+
+def square_name(sq: int) -> str:
+    file, rank = tile(sq)
+    return "%s%i" % (FILE_NAMES[file], rank)
+
+
+def parse_square(text: str) -> int:
+    if len(text) != 2 or text[0] not in FILE_NAMES or not "0" <= text[1] < str(RANKS):
+        raise ValueError("invalid square %r" % text)
+    return square(FILE_NAMES.index(text[0]), int(text[1]))
+
+
+def move_to_text(move: int) -> str:
+    text = square_name(move & 0xFF) + square_name(move >> 8 & 0xFF)
+    return text + "q" if move & PROMOTION else text
+
+
+def parse_move(position: Position, text: str) -> int:
+    """the legal move of ``position`` written as ``text``"""
+    code = parse_square(text[:2]) * SQUARES + parse_square(text[2:4])
+    if text[4:] not in ("", "q"):
+        raise InvalidGame("invalid move %r" % text)
+    return unpack_move(position, code)
+
+
+def pack_move(move: int) -> int:
+    """the 16 bit code of a move; promotions are implied as pawns always become queens"""
+    return (move & 0xFF) * SQUARES + (move >> 8 & 0xFF)
+
+
+def unpack_move(position: Position, code: int) -> int:
+    """the legal move of ``position`` with the 16 bit ``code``"""
+    if not 0 <= code < SQUARES * SQUARES:
+        # the start square would spill into the bits of the target
+        raise InvalidGame("invalid move code %i in move %i" % (code, position.move_count))
+    start, target = divmod(code, SQUARES)
+    move = start | target << 8
+    if piece_kind(position.mailbox[start]) == PAWN and target < TOTAL_FILES:
+        move |= PROMOTION
+    if not is_pseudo_legal(position, move) or not is_legal(position, move):
+        raise InvalidGame("illegal move %s in move %i" % (move_to_text(move), position.move_count))
+    return move
+
+
+def _castling_squares(position: Position) -> int:
+    pieces = position.pieces
+    return pieces[ROOK] | pieces[KING] | pieces[6 + ROOK] | pieces[6 + KING]
+
+
+def to_fen(position: Position) -> str:
+    ranks = []
+    for rank in range(RANKS - 1, -1, -1):
+        text = ""
+        empty = 0
+        for file in range(TOTAL_FILES):
+            p = position.mailbox[square(file, rank)]
+            if p == EMPTY:
+                empty += 1
+                continue
+            if empty:
+                text += str(empty)
+                empty = 0
+            text += LABELS[p]
+        if empty:
+            text += str(empty)
+        ranks.append(text)
+
+    unmoved = ",".join(square_name(sq) for sq in bits(position.unmoved & _castling_squares(position))) or "-"
+    return "%s %s %s %i" % ("/".join(ranks), "wb"[position.turn], unmoved, position.move_count)
+
+
+def from_fen(text: str) -> Position:
+    try:
+        placement, turn, unmoved, move_count = text.split()
+        rows = placement.split("/")
+        if len(rows) != RANKS or turn not in ("w", "b"):
+            raise ValueError()
+
+        position = Position()
+        for rank, row in zip(range(RANKS - 1, -1, -1), rows):
+            file = 0
+            number = ""
+            for char in row + " ":
+                if char.isdigit():
+                    number += char
+                    continue
+                if number:
+                    file += int(number)
+                    number = ""
+                if char == " ":
+                    break
+                if not does_tile_exist(file, rank):
+                    raise ValueError()
+                position.put(LABELS.index(char), square(file, rank))
+                file += 1
+            if file != TOTAL_FILES:
+                raise ValueError()
+        if any(bin(position.pieces[piece(color, KING)]).count("1") != 1 for color in (WHITE, BLACK)):
+            raise ValueError()
+
+        position.turn = WHITE if turn == "w" else BLACK
+        position.move_count = int(move_count)
+        if unmoved != "-":
+            for name in unmoved.split(","):
+                position.unmoved |= 1 << parse_square(name)
+        # only kings and rooks are listed, the others count as unmoved on their initial squares
+        initial = Position.initial()
+        for sq in bits(position.occupied & ~_castling_squares(position)):
+            if initial.mailbox[sq] == position.mailbox[sq]:
+                position.unmoved |= 1 << sq
+        position.compute_key()
+        return position
+    except ValueError:
+        raise ValueError("invalid position %r" % text) from None
+
+
+START_FEN = to_fen(Position.initial())
+
+
+def game_to_text(game: Game) -> str:
+    return " ".join([game.result] + [move_to_text(move) for move in game.moves])
+
+
+def game_from_text(text: str) -> Game:
+    result, *moves = text.split()
+    if result not in RESULTS:
+        raise InvalidGame("invalid result %r" % result)
+    position = Position.initial()
+    played = []
+    for move_text in moves:
+        move = parse_move(position, move_text)
+        position.make_move(move)
+        played.append(move)
+    return Game(played, result)
+
+
+def write_games(stream: BinaryIO, games: Iterable[Game]):
+    """appends games to an archive opened for binary writing; writes the header if it is empty"""
+    if stream.tell() == 0:
+        stream.write(MAGIC)
+    for game in games:
+        stream.write(_GAME_HEADER.pack(len(game.moves), RESULTS.index(game.result)))
+        stream.write(struct.pack(">%iH" % len(game.moves), *map(pack_move, game.moves)))
+
+
+def read_games(stream: BinaryIO) -> Iterator[Tuple[List[int], str]]:
+    """
+    Yields the packed moves and the result of every game of an archive without
+    reading the whole file. Use ``replay`` to turn the codes into moves.
+    """
+    if stream.read(len(MAGIC)) != MAGIC:
+        raise InvalidGame("not a game archive")
+    header_size = _GAME_HEADER.size
+    while True:
+        header = stream.read(header_size)
+        if not header:
+            return
+        if len(header) != header_size:
+            raise InvalidGame("truncated archive")
+        count, result = _GAME_HEADER.unpack(header)
+        data = stream.read(2 * count)
+        if len(data) != 2 * count or result >= len(RESULTS):
+            raise InvalidGame("truncated archive")
+        yield list(struct.unpack(">%iH" % count, data)), RESULTS[result]
+
+
+def replay(codes: List[int], result: str = UNKNOWN) -> Tuple[Game, Position]:
+    """
+    Plays the packed moves from the initial setup, checking that every move is legal
+    and that the result fits a game ending in checkmate or stalemate.
+    """
+    position = Position.initial()
+    moves = []
+    for code in codes:
+        move = unpack_move(position, code)
+        position.make_move(move)
+        moves.append(move)
+
+    if result != UNKNOWN and not generate_legal_moves(position):
+        if not in_check(position, position.turn):
+            expected = DRAW
+        else:
+            expected = BLACK_WINS if position.turn == WHITE else WHITE_WINS
+        if result != expected:
+            raise InvalidGame("result %s but the game ended %s" % (result, expected))
+    return Game(moves, result), position
+
+
+def replay_games(stream: BinaryIO) -> Iterator[Tuple[Game, Position]]:
+    for codes, result in read_games(stream):
+        yield replay(codes, result)
+
+
+def random_game(rng: random.Random, max_moves: int = 300) -> Game:
+    position = Position.initial()
+    moves = []
+    while len(moves) < max_moves:
+        legal = generate_legal_moves(position)
+        if not legal:
+            if not in_check(position, position.turn):
+                return Game(moves, DRAW)
+            return Game(moves, BLACK_WINS if position.turn == WHITE else WHITE_WINS)
+        move = rng.choice(legal)
+        position.make_move(move)
+        moves.append(move)
+    return Game(moves, UNKNOWN)
+
+
+def main():
+    if len(sys.argv) < 3 or sys.argv[1] not in ("generate", "replay"):
+        print("usage: python notation.py generate ARCHIVE GAMES | replay ARCHIVE")
+        sys.exit(2)
+
+    if sys.argv[1] == "generate":
+        rng = random.Random(0)
+        with open(sys.argv[2], "ab") as archive:
+            write_games(archive, (random_game(rng) for _ in range(int(sys.argv[3]))))
+        return
+
+    start = time.perf_counter()
+    games = moves = 0
+    with open(sys.argv[2], "rb") as archive:
+        for game, _ in replay_games(archive):
+            games += 1
+            moves += len(game.moves)
+    elapsed = time.perf_counter() - start
+    print("%i games, %i moves in %.2fs: %.1f games/s, %i moves/s" % (
+        games, moves, elapsed, games / elapsed, moves / elapsed
+    ))
+
+
+if __name__ == "__main__":
+    main()
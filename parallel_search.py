@@ -0,0 +1,130 @@
+"""
+Lazy SMP: several processes search the same position and share one transposition
+table in shared memory. Whatever one worker stores the others find, so the workers
+spread over the tree and the first one to finish ends the search.
+
+    python parallel_search.py [depth]
+
+reports the time to reach ``depth`` and the speedup with 1, 2, 4 and 8 workers.
+"""
+import multiprocessing
+import random
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing.shared_memory import SharedMemory
+from typing import List, Optional
+
+from bitboard import Position
+from engine import MAX_PLY, Engine, SearchInfo
+from movegen import generate_legal_moves
+from transposition import ENTRY_BYTES, TranspositionTable
+
+_engine: Optional[Engine] = None
+_memory: Optional[SharedMemory] = None
+_stop_event = None
+
+
+class _WorkerEngine(Engine):
+    def _check_limits(self):
+        if _stop_event.is_set():
+            self.stopped = True
+        Engine._check_limits(self)
+
+
+def _init_worker(memory_name: str, stop_event):
+    global _engine, _memory, _stop_event
+    _memory = SharedMemory(name=memory_name)
+    _stop_event = stop_event
+    _engine = _WorkerEngine(tt=TranspositionTable(buffer=_memory.buf))
+
+
+def _search_job(position: Position, worker: int, max_depth: int, time_limit: Optional[float],
+                node_limit: Optional[int]) -> SearchInfo:
+    # every other helper starts one iteration deeper to get ahead of the others
+    return _engine.search(position, max_depth, time_limit, node_limit, start_depth=1 + worker % 2)
+
+
+class ParallelEngine():
+    """``Engine.search`` on ``workers`` processes; use as a context manager or call ``close``"""
+
+    def __init__(self, workers: int = multiprocessing.cpu_count(), tt_size_mb: float = 64):
+        entries = 1 << max(int(tt_size_mb * (1 << 20) // ENTRY_BYTES).bit_length() - 1, 0)
+        self.workers = workers
+        self.memory = SharedMemory(create=True, size=entries * ENTRY_BYTES)
+        self.tt = TranspositionTable(buffer=self.memory.buf)
+        self.tt.clear()
+        context = multiprocessing.get_context()
+        self._stop_event = context.Event()
+        self.executor = ProcessPoolExecutor(
+            workers, mp_context=context, initializer=_init_worker, initargs=(self.memory.name, self._stop_event)
+        )
+
+    def search(self, position: Position, max_depth: int = MAX_PLY, time_limit: Optional[float] = None,
+               node_limit: Optional[int] = None) -> SearchInfo:
+        """the deepest result of all workers; nodes are summed up"""
+        self._stop_event.clear()
+        start = time.perf_counter()
+        futures = [
+            self.executor.submit(_search_job, position, worker, max_depth, time_limit, node_limit)
+            for worker in range(self.workers)
+        ]
+        wait(futures, return_when=FIRST_COMPLETED)
+        self._stop_event.set()
+        results = [future.result() for future in futures]
+        best = max(results, key=lambda result: result.depth)    # the first worker wins ties
+        return best._replace(nodes=sum(result.nodes for result in results), time=time.perf_counter() - start)
+
+    def clear(self):
+        self.tt.clear()
+
+    def close(self):
+        self.executor.shutdown()
+        del self.tt
+        self.memory.close()
+        self.memory.unlink()
+
+    def __enter__(self) -> "ParallelEngine":
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+
+def benchmark_positions(count: int = 4, plies: int = 16, seed: int = 1) -> List[Position]:
+    """the start position and positions after a few random moves"""
+    rng = random.Random(seed)
+    positions = [Position.initial()]
+    while len(positions) < count:
+        position = Position.initial()
+        for _ in range(plies):
+            moves = generate_legal_moves(position)
+            if not moves:
+                break
+            position.make_move(rng.choice(moves))
+        else:
+            positions.append(position)
+    return positions
+
+
+def main():
+    depth = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    positions = benchmark_positions()
+    baseline = None
+    for workers in (1, 2, 4, 8):
+        with ParallelEngine(workers) as engine:
+            elapsed = 0.0
+            nodes = 0
+            for position in positions:
+                engine.clear()
+                result = engine.search(position, max_depth=depth)
+                elapsed += result.time
+                nodes += result.nodes
+        baseline = baseline or elapsed
+        print("%i workers: %.2fs to depth %i, %i nodes/s, speedup %.2f" % (
+            workers, elapsed, depth, nodes / elapsed, baseline / elapsed
+        ))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,18 @@
 from typing import Tuple, Union
+import numpy as np
 import pygame
 import math
 
+from bitboard import FILES, TOTAL_FILES, RANKS, does_tile_exist
+
 FULL_CIRCLE_ANGLE = math.pi * 2
+FILE_ANGLE = math.pi / FILES
 
 class PolarCoordinate():
     __slots__ = ('__r', '__phi')
     def __init__(self, r: float = 1, phi: float = 0):
-        self.r = r
         self.phi = phi
+        self.r = r
     
     def __repr__(self) -> str:
         return "Polar<%i * e^(%fi)>" % (self.r, self.phi)
@@ -40,7 +44,7 @@ class PolarCoordinate():
     
     def __complex__(self) -> complex:
         if self.phi == math.pi:
-            return complex(-1)
+            return complex(-self.r)
         return complex(self.r * math.cos(self.phi), self.r * math.sin(self.phi))
     
     def to_cartesian(self, screen: pygame.Surface) -> Tuple[float, float]:
@@ -79,3 +83,129 @@ class PolarCoordinate():
     __rsub__ = __sub__
     __rmul__ = __mul__
     __rdiv__ = __div__
+
+
+# does_tile_exist for every (rank, file)
+_EXISTING_TILES = np.array([[does_tile_exist(file, rank) for file in range(TOTAL_FILES)] for rank in range(RANKS)])
+
+
+def normalize_angles(phi) -> np.ndarray:
+    """the angles in [0, 2pi], computed exactly like the ``PolarCoordinate.phi`` setter"""
+    phi = np.array(phi, dtype=float)
+    while True:
+        over = phi > FULL_CIRCLE_ANGLE
+        if not over.any():
+            break
+        phi[over] -= FULL_CIRCLE_ANGLE
+    while True:
+        under = phi < 0
+        if not under.any():
+            break
+        phi[under] += FULL_CIRCLE_ANGLE
+    return phi
+
+
+class PolarArray():
+    """
+    Many polar coordinates at once; ``r`` and ``phi`` are NumPy arrays. The results are
+    the ones ``PolarCoordinate`` gives for every single coordinate, except that the
+    angles of ``np.arctan2`` may differ from ``math.atan2`` in the last bit.
+    """
+    __slots__ = ('r', 'phi')
+
+    def __init__(self, r=1.0, phi=0.0):
+        r = np.array(r, dtype=float)
+        phi = normalize_angles(np.broadcast_to(np.asarray(phi, dtype=float), r.shape))
+        negative = r < 0
+        if negative.any():
+            r = np.where(negative, -r, r)
+            phi = np.where(negative, normalize_angles(phi + math.pi), phi)
+        self.r = r
+        self.phi = phi
+
+    def __repr__(self) -> str:
+        return "PolarArray<r=%s, phi=%s>" % (self.r, self.phi)
+
+    def __len__(self) -> int:
+        return len(self.r)
+
+    def __getitem__(self, index) -> Union[PolarCoordinate, "PolarArray"]:
+        if np.ndim(self.r[index]) == 0:
+            return PolarCoordinate(float(self.r[index]), float(self.phi[index]))
+        return PolarArray(self.r[index], self.phi[index])
+
+    @classmethod
+    def from_coordinates(cls, coordinates) -> "PolarArray":
+        coordinates = list(coordinates)
+        return cls([c.r for c in coordinates], [c.phi for c in coordinates])
+
+    def to_complex(self) -> np.ndarray:
+        half_turn = self.phi == math.pi
+        real = np.where(half_turn, -self.r, self.r * np.cos(self.phi))
+        imag = np.where(half_turn, 0.0, self.r * np.sin(self.phi))
+        return real + 1j * imag
+
+    def to_cartesian(self, screen: pygame.Surface) -> Tuple[np.ndarray, np.ndarray]:
+        x, y = screen.get_size()
+        c = self.to_complex()
+        return c.real + x // 2, c.imag + y // 2
+
+    @classmethod
+    def from_complex(cls, compl) -> "PolarArray":
+        compl = np.asarray(compl, dtype=complex)
+        real = compl.real
+        imag = compl.imag
+        return cls(np.sqrt(imag * imag + real * real), np.arctan2(imag, real))
+
+    @classmethod
+    def from_cartesian(cls, x, y) -> "PolarArray":
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        return cls(np.sqrt(y * y + x * x), np.arctan2(y, x))
+
+    def __neg__(self) -> "PolarArray":
+        return PolarArray(self.r, self.phi + math.pi)
+
+    def __add__(self, other: Union["PolarArray", PolarCoordinate]) -> "PolarArray":
+        return PolarArray.from_complex(self.to_complex() + _to_complex(other))
+
+    def __sub__(self, other: Union["PolarArray", PolarCoordinate]) -> "PolarArray":
+        return self + (-other)
+
+    def __mul__(self, other) -> "PolarArray":
+        if isinstance(other, (PolarArray, PolarCoordinate)):
+            return PolarArray(self.r * other.r, self.phi + other.phi)
+        return PolarArray(other * self.r, self.phi)
+
+    def __truediv__(self, other) -> "PolarArray":
+        if isinstance(other, (PolarArray, PolarCoordinate)):
+            return PolarArray(self.r / other.r, self.phi - other.phi)
+        return PolarArray(self.r / other, self.phi)
+
+    __radd__ = __add__
+    __rmul__ = __mul__
+
+    def to_tiles(self, tile_height: float, offset: float) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        The (file, rank) of the tile under every coordinate like ``main.polar_to_tile``,
+        both -1 where there is no tile.
+        """
+        files = ((FULL_CIRCLE_ANGLE - self.phi) / FILE_ANGLE).astype(int)
+        ranks = ((self.r - offset) / tile_height).astype(int)
+        valid = (self.r >= offset) & (self.r <= 2 * RANKS * tile_height)
+        valid &= (files >= 0) & (files < TOTAL_FILES) & (ranks >= 0) & (ranks < RANKS)
+        valid &= _EXISTING_TILES[np.clip(ranks, 0, RANKS - 1), np.clip(files, 0, TOTAL_FILES - 1)]
+        return np.where(valid, files, -1), np.where(valid, ranks, -1)
+
+    @classmethod
+    def from_tiles(cls, files, ranks, tile_height: float, offset: float) -> "PolarArray":
+        """the inner middle point of every tile like ``main.tile_to_polar``"""
+        files = np.asarray(files)
+        ranks = np.asarray(ranks)
+        return cls(ranks * tile_height + offset, -files * FILE_ANGLE + FULL_CIRCLE_ANGLE - FILE_ANGLE / 2)
+
+
+def _to_complex(coordinate: Union[PolarArray, PolarCoordinate]):
+    if isinstance(coordinate, PolarArray):
+        return coordinate.to_complex()
+    return complex(coordinate)
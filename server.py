@@ -0,0 +1,320 @@
+"""
+Game server: many ``ChesssBoard`` games in one process, played over TCP.
+
+    python server.py serve [--host HOST] [--port PORT] [--idle SECONDS]
+    python server.py load [--games N] [--connections N] [--seconds S]
+
+Every message is one line of JSON. A client sends
+
+    {"type": "new"}                                  -> {"type": "created", "game": 1, "color": "white"}
+    {"type": "join", "game": 1}                      -> {"type": "joined", "game": 1, "color": "black"}
+    {"type": "move", "game": 1, "from": [f, r], "to": [f, r]}
+                                                     -> {"type": "ack", "game": 1, "ok": true, ...}
+    {"type": "state", "game": 1}                     -> {"type": "state", "game": 1, "fen": "...", ...}
+    {"type": "leave", "game": 1}                     -> {"type": "left", "game": 1}
+
+Moves are checked by ``ChesssBoard.move_piece``. The opponent gets the move pushed as
+``{"type": "moved", ...}`` together with the check state and the result. Games
+nobody touched for ``--idle`` seconds are dropped and their players get
+``{"type": "evicted", "game": 1}``. Errors are answered with ``{"type": "error", "error": ...}``.
+Lines longer than ``MAX_LINE`` bytes get an error and the connection is closed.
+
+``load`` plays random games against a server with many games per connection and
+reports moves per second and the time until moves are acknowledged.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+from bitboard import Position, move_start, move_target, tile
+from circle_chess import ChesssBoard, GameState
+from movegen import generate_legal_moves
+from notation import to_fen
+
+COLORS = ("white", "black")
+# longest message line in bytes, the limit of the stream readers
+MAX_LINE = 64 * 1024
+
+
+class Game():
+    __slots__ = ("id", "board", "players", "last_active")
+
+    def __init__(self, game_id: int):
+        self.id = game_id
+        self.board = ChesssBoard()
+        self.players: List[Optional["Session"]] = [None, None]
+        self.last_active = time.monotonic()
+
+    def status(self) -> dict:
+        board = self.board
+        return {
+            "game": self.id,
+            "turn": COLORS[board.get_player()],
+            "checked": board.checked,
+            "done": board.state is GameState.DONE,
+            "winner": None if board.winner is None else COLORS[board.winner],
+        }
+
+
+class Session():
+    """one connection; it can sit at many games"""
+    __slots__ = ("writer", "seats")
+
+    def __init__(self, writer: asyncio.StreamWriter):
+        self.writer = writer
+        self.seats: Set[Tuple[int, int]] = set()
+
+    def send(self, message: dict):
+        self.writer.write(json.dumps(message).encode() + b"\n")
+
+
+class GameServer():
+    def __init__(self, idle_timeout: float = 600):
+        self.idle_timeout = idle_timeout
+        self.games: Dict[int, Game] = {}
+        self._next_id = 1
+        self.moves = 0
+
+    def _seat(self, session: Session, message: dict) -> Tuple[Game, int]:
+        game = self.games.get(message.get("game"))
+        if game is None:
+            raise ValueError("unknown game")
+        for color in (0, 1):
+            if game.players[color] is session and (game.id, color) in session.seats:
+                if message["type"] != "move" or color == game.board.get_player():
+                    return game, color
+        raise ValueError("not your turn" if session in game.players else "not your game")
+
+    def handle_message(self, session: Session, message: dict) -> dict:
+        """the answer to one message; moves are pushed to the opponent"""
+        if not isinstance(message, dict):
+            raise ValueError("messages have to be JSON objects")
+        kind = message.get("type")
+        if kind == "new":
+            game = Game(self._next_id)
+            self._next_id += 1
+            self.games[game.id] = game
+            game.players[0] = session
+            session.seats.add((game.id, 0))
+            return {"type": "created", "game": game.id, "color": COLORS[0]}
+
+        if kind == "join":
+            game = self.games.get(message.get("game"))
+            if game is None:
+                raise ValueError("unknown game")
+            if game.players[1] is not None:
+                raise ValueError("game is full")
+            game.players[1] = session
+            session.seats.add((game.id, 1))
+            game.last_active = time.monotonic()
+            if game.players[0] is not None:
+                game.players[0].send({"type": "opponent", "game": game.id})
+            return {"type": "joined", "game": game.id, "color": COLORS[1]}
+
+        if kind == "move":
+            game, color = self._seat(session, message)
+            start, target = tuple(message["from"]), tuple(message["to"])
+            ok = game.board.move_piece(start, target)
+            game.last_active = time.monotonic()
+            status = game.status()
+            if ok:
+                self.moves += 1
+                opponent = game.players[1 - color]
+                if opponent is not None:
+                    opponent.send(dict(status, type="moved", **{"from": start, "to": target}))
+            return dict(status, type="ack", ok=ok)
+
+        if kind == "state":
+            game, _ = self._seat(session, message)
+            return dict(game.status(), type="state", fen=to_fen(game.board.position))
+
+        if kind == "leave":
+            game, color = self._seat(session, message)
+            self._leave(game, color)
+            return {"type": "left", "game": game.id}
+
+        raise ValueError("unknown message type %r" % kind)
+
+    def _leave(self, game: Game, color: int):
+        session = game.players[color]
+        game.players[color] = None
+        if session is not None:
+            session.seats.discard((game.id, color))
+        opponent = game.players[1 - color]
+        if opponent is None:
+            self.games.pop(game.id, None)
+        else:
+            opponent.send({"type": "opponent_left", "game": game.id})
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        session = Session(writer)
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    # over the limit; where the next message starts is unknown
+                    session.send({"type": "error", "error": "messages are limited to %i bytes" % MAX_LINE})
+                    await writer.drain()
+                    break
+                if not line:
+                    break
+                message = None
+                try:
+                    message = json.loads(line)
+                    answer = self.handle_message(session, message)
+                except (ValueError, KeyError, TypeError) as error:
+                    answer = {"type": "error", "error": str(error)}
+                    if isinstance(message, dict) and "game" in message:
+                        answer["game"] = message["game"]
+                session.send(answer)
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            for game_id, color in list(session.seats):
+                game = self.games.get(game_id)
+                if game is not None:
+                    self._leave(game, color)
+            writer.close()
+
+    def evict_idle(self) -> int:
+        """drops the games without a move or join for ``idle_timeout`` seconds"""
+        now = time.monotonic()
+        idle = [game for game in self.games.values() if now - game.last_active > self.idle_timeout]
+        for game in idle:
+            for color, session in enumerate(game.players):
+                if session is not None:
+                    session.seats.discard((game.id, color))
+                    session.send({"type": "evicted", "game": game.id})
+            del self.games[game.id]
+        return len(idle)
+
+    async def _evict_loop(self):
+        while True:
+            await asyncio.sleep(min(self.idle_timeout / 4, 30))
+            self.evict_idle()
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 8765):
+        server = await asyncio.start_server(self.handle, host, port, limit=MAX_LINE)
+        evictor = asyncio.ensure_future(self._evict_loop())
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            evictor.cancel()
+
+
+async def _load_pair(host: str, port: int, games: int, deadline: float, rng: random.Random,
+                     latencies: List[float], stats: Dict[str, int], max_plies: int):
+    """two connections playing ``games`` games against each other with random moves"""
+    streams = [await asyncio.open_connection(host, port) for _ in range(2)]
+    writers = [writer for _, writer in streams]
+    # both sides of a game share the position, the side to move sends the next move
+    playing: Dict[int, Position] = {}
+    sent: Dict[Tuple[int, int], float] = {}
+
+    def send(color: int, message: dict):
+        writers[color].write(json.dumps(message).encode() + b"\n")
+
+    def finish(game_id: int):
+        del playing[game_id]
+        if not playing and time.perf_counter() >= deadline:
+            for writer in writers:
+                writer.write_eof()
+
+    def play(game_id: int):
+        position = playing[game_id]
+        moves = generate_legal_moves(position)
+        if time.perf_counter() >= deadline:
+            finish(game_id)
+        elif not moves or position.move_count >= max_plies or position.repetitions() >= 3:
+            stats["games"] += 1
+            send(0, {"type": "leave", "game": game_id})
+            send(1, {"type": "leave", "game": game_id})
+            send(0, {"type": "new"})
+            finish(game_id)
+        else:
+            move = rng.choice(moves)
+            color = position.turn
+            position.make_move(move)
+            sent[game_id, color] = time.perf_counter()
+            send(color, {"type": "move", "game": game_id, "from": tile(move_start(move)), "to": tile(move_target(move))})
+
+    async def read(color: int):
+        reader = streams[color][0]
+        while True:
+            line = await reader.readline()
+            if not line:
+                return
+            message = json.loads(line)
+            kind = message["type"]
+            if kind == "created":
+                send(1, {"type": "join", "game": message["game"]})
+            elif kind == "joined":
+                playing[message["game"]] = Position.initial()
+                play(message["game"])
+            elif kind == "ack":
+                latencies.append(time.perf_counter() - sent.pop((message["game"], color)))
+                stats["moves"] += 1
+                if not message["ok"]:
+                    stats["errors"] += 1
+            elif kind == "moved":
+                play(message["game"])
+            elif kind == "error":
+                stats["errors"] += 1
+
+    for _ in range(games):
+        send(0, {"type": "new"})
+    await asyncio.gather(read(0), read(1))
+    for writer in writers:
+        writer.close()
+
+
+async def load(host: str, port: int, games: int, connections: int, seconds: float, max_plies: int = 200) -> dict:
+    latencies: List[float] = []
+    stats = {"moves": 0, "games": 0, "errors": 0}
+    pairs = max(connections // 2, 1)
+    rng = random.Random(0)
+    start = time.perf_counter()
+    deadline = start + seconds
+    await asyncio.gather(*(
+        _load_pair(host, port, games // pairs + (i < games % pairs), deadline, rng, latencies, stats, max_plies)
+        for i in range(pairs)
+    ))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return dict(
+        stats,
+        moves_per_second=stats["moves"] / elapsed,
+        p50_ms=1000 * latencies[len(latencies) // 2] if latencies else 0,
+        p99_ms=1000 * latencies[int(len(latencies) * 0.99)] if latencies else 0,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="circular chess game server")
+    parser.add_argument("command", choices=("serve", "load"))
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--idle", type=float, default=600, help="seconds until an untouched game is dropped")
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--connections", type=int, default=20)
+    parser.add_argument("--seconds", type=float, default=20)
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        asyncio.run(GameServer(args.idle).serve(args.host, args.port))
+        return
+
+    result = asyncio.run(load(args.host, args.port, args.games, args.connections, args.seconds))
+    print("%i games, %i moves, %i errors: %.0f moves/s, ack latency p50 %.1f ms, p99 %.1f ms" % (
+        result["games"], result["moves"], result["errors"], result["moves_per_second"], result["p50_ms"], result["p99_ms"]
+    ))
+
+
+if __name__ == "__main__":
+    main()
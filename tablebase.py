@@ -0,0 +1,428 @@
+"""
+Endgame tablebases: perfect play for a king and a few pieces against a lone king.
+
+    python tablebase.py generate DIRECTORY [MATERIAL ...] [--workers N]
+    python tablebase.py probe DIRECTORY [MATERIAL ...]
+
+generates the tables (KQK, KRK, KPK by default; KPK needs KQK for promotions) or
+measures how long probing takes.
+
+The board has two symmetries: turning it by half a circle and mirroring the files.
+Positions are stored with the king of the stronger side on the files a - f and
+the lone king and the other pieces on any existing tile. The index is
+
+    ((((king * 184 + lone king) * 184 + piece 1) * 184 + piece 2 ...) * 2 + turn
+
+where turn is 0 if the stronger side moves. Each position is one byte: 0 is a draw,
+``ILLEGAL`` an impossible position, anything else is the distance to mate in plies
+plus one. Odd values are lost and even values won for the player to move.
+
+The tables are built backwards from the mates: positions where the stronger side
+can reach a lost position are won, positions where every move of the lone king
+leads to a won position are lost. A capture by the lone king is always a draw.
+
+KBNK works the same way but has 573 million positions, more than this is made for.
+"""
+import argparse
+import mmap
+import multiprocessing
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from bitboard import (
+    TOTAL_FILES, SQUARES, WHITE, BLACK, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING,
+    Position, bits, piece, piece_kind, square, tile, does_tile_exist
+)
+from attacks import KNIGHT_ATTACKS, KING_ATTACKS, PAWN_ATTACKS, PAWN_PUSHES, rook_attacks, bishop_attacks, queen_attacks
+
+MAGIC = b"CCTB"
+DEFAULT_MATERIAL = ("KQK", "KRK", "KPK")
+ILLEGAL = 255
+WIN = 1
+DRAW = 0
+LOSS = -1
+
+_NAMES = "PNBRQK"
+
+EXISTING_SQUARES = [sq for sq in range(SQUARES) if does_tile_exist(*tile(sq))]
+COMPACT = [-1] * SQUARES
+for _i, _sq in enumerate(EXISTING_SQUARES):
+    COMPACT[_sq] = _i
+N = len(EXISTING_SQUARES)
+
+# the file maps of the symmetries; every orbit has exactly one file in 0 - 5
+_FILE_MAPS = (
+    lambda f: f,
+    lambda f: (f + TOTAL_FILES // 2) % TOTAL_FILES,
+    lambda f: TOTAL_FILES - 1 - f,
+    lambda f: (TOTAL_FILES // 2 - 1 - f) % TOTAL_FILES,
+)
+_CANONICAL_FILES = TOTAL_FILES // 4
+# SYMMETRIC[t][sq] is the square mirrored or turned by symmetry t
+SYMMETRIC = [[square(file_map(sq % TOTAL_FILES), sq // TOTAL_FILES) for sq in range(SQUARES)] for file_map in _FILE_MAPS]
+KING_SQUARES = [sq for sq in EXISTING_SQUARES if sq % TOTAL_FILES < _CANONICAL_FILES]
+# the symmetry moving a square to the canonical files and the index of the king there
+_SYMMETRY = [
+    next((t for t in range(4) if SYMMETRIC[t][sq] % TOTAL_FILES < _CANONICAL_FILES), 0) for sq in range(SQUARES)
+]
+_KING_INDEX = [-1] * SQUARES
+for _i, _sq in enumerate(KING_SQUARES):
+    _KING_INDEX[_sq] = _i
+del _i, _sq
+
+_DOUBLE_STEP_RANK = 6
+
+
+def parse_material(name: str) -> Tuple[int, ...]:
+    """the pieces besides the kings, e.g. (BISHOP, KNIGHT) for KBNK"""
+    if len(name) < 3 or name[0] != "K" or name[-1] != "K" or any(c not in _NAMES[:5] for c in name[1:-1]):
+        raise ValueError("material must be a king with pieces against a king, not %r" % name)
+    return tuple(_NAMES.index(c) for c in name[1:-1])
+
+
+def material_name(kinds) -> str:
+    return "K" + "".join(_NAMES[kind] for kind in sorted(kinds, reverse=True)) + "K"
+
+
+def table_size(kinds) -> int:
+    return len(KING_SQUARES) * N ** (len(kinds) + 1) * 2
+
+
+def encode(king: int, lone_king: int, pieces: List[int], turn: int) -> int:
+    """the index of a position; squares are turned or mirrored as needed"""
+    t = _SYMMETRY[king]
+    symmetric = SYMMETRIC[t]
+    index = _KING_INDEX[symmetric[king]] * N + COMPACT[symmetric[lone_king]]
+    for sq in pieces:
+        index = index * N + COMPACT[symmetric[sq]]
+    return index * 2 + turn
+
+
+def decode(index: int, count: int) -> Tuple[int, int, List[int], int]:
+    """king, lone king, the squares of ``count`` pieces and the player to move"""
+    index, turn = divmod(index, 2)
+    pieces = [0] * count
+    for i in range(count - 1, -1, -1):
+        index, compact = divmod(index, N)
+        pieces[i] = EXISTING_SQUARES[compact]
+    king, lone_king = divmod(index, N)
+    return KING_SQUARES[king], EXISTING_SQUARES[lone_king], pieces, turn
+
+
+def _attacks(kind: int, sq: int, occupied: int) -> int:
+    if kind == PAWN:
+        return PAWN_ATTACKS[sq]
+    elif kind == KNIGHT:
+        return KNIGHT_ATTACKS[sq]
+    elif kind == BISHOP:
+        return bishop_attacks(sq, occupied)
+    elif kind == ROOK:
+        return rook_attacks(sq, occupied)
+    return queen_attacks(sq, occupied)
+
+
+def _pieces_attack(kinds, pieces: List[int], occupied: int, skip: int = -1) -> int:
+    attacked = 0
+    for i, sq in enumerate(pieces):
+        if i != skip:
+            attacked |= _attacks(kinds[i], sq, occupied)
+    return attacked
+
+
+def _is_legal(kinds, king: int, lone_king: int, pieces: List[int], turn: int) -> bool:
+    occupied = 1 << king | 1 << lone_king
+    for kind, sq in zip(kinds, pieces):
+        if occupied >> sq & 1 or (kind == PAWN and not 0 < sq // TOTAL_FILES < _DOUBLE_STEP_RANK + 1):
+            return False
+        occupied |= 1 << sq
+    if KING_ATTACKS[king] >> lone_king & 1:
+        return False
+    # the lone king can't be in check when the other side is to move
+    return turn == BLACK or not _pieces_attack(kinds, pieces, occupied) >> lone_king & 1
+
+
+def _lone_king_moves(kinds, king: int, lone_king: int, pieces: List[int]) -> Tuple[List[int], bool, bool]:
+    """the target squares of the lone king without captures, whether it can capture and whether it is in check"""
+    occupied = 1 << king | 1 << lone_king
+    for sq in pieces:
+        occupied |= 1 << sq
+    without_king = occupied ^ 1 << lone_king
+    attacked = _pieces_attack(kinds, pieces, without_king) | KING_ATTACKS[king]
+    targets = []
+    capture = False
+    for target in bits(KING_ATTACKS[lone_king] & ~KING_ATTACKS[king]):
+        if occupied >> target & 1:
+            i = pieces.index(target)
+            if not (_pieces_attack(kinds, pieces, without_king, skip=i) | KING_ATTACKS[king]) >> target & 1:
+                capture = True
+        elif not attacked >> target & 1:
+            targets.append(target)
+    in_check = bool(_pieces_attack(kinds, pieces, occupied) >> lone_king & 1)
+    return targets, capture, in_check
+
+
+def _promotions(kinds, king: int, lone_king: int, pieces: List[int]) -> Iterator[Tuple[List[int], List[int]]]:
+    """pawns reaching rank 0: the kinds and squares after queening"""
+    occupied = 1 << king | 1 << lone_king
+    for sq in pieces:
+        occupied |= 1 << sq
+    for i, kind in enumerate(kinds):
+        if kind == PAWN and pieces[i] < TOTAL_FILES * 2:
+            target = PAWN_PUSHES[pieces[i]]
+            if target != -1 and not occupied >> target & 1:
+                new_kinds = list(kinds[:i]) + [QUEEN] + list(kinds[i + 1:])
+                new_pieces = pieces[:i] + [target] + pieces[i + 1:]
+                order = sorted(range(len(new_kinds)), key=lambda j: -new_kinds[j])
+                yield [new_kinds[j] for j in order], [new_pieces[j] for j in order]
+
+
+def _unmoves(kinds, king: int, lone_king: int, pieces: List[int], turn: int) -> Iterator[int]:
+    """the indices of the positions from which a move leads to this one"""
+    occupied = 1 << king | 1 << lone_king
+    for sq in pieces:
+        occupied |= 1 << sq
+    empty = ~occupied
+
+    if turn == WHITE:
+        for origin in bits(KING_ATTACKS[lone_king] & empty):
+            yield encode(king, origin, pieces, BLACK)
+        return
+
+    for origin in bits(KING_ATTACKS[king] & empty):
+        yield encode(origin, lone_king, pieces, WHITE)
+    for i, kind in enumerate(kinds):
+        sq = pieces[i]
+        if kind == PAWN:
+            origins = []
+            rank = sq // TOTAL_FILES
+            above = sq + TOTAL_FILES
+            if rank < _DOUBLE_STEP_RANK and empty >> above & 1:
+                origins.append(above)
+                if rank == _DOUBLE_STEP_RANK - 2 and empty >> (above + TOTAL_FILES) & 1:
+                    origins.append(above + TOTAL_FILES)
+        else:
+            origins = bits(_attacks(kind, sq, occupied) & empty)
+        for origin in origins:
+            yield encode(king, lone_king, pieces[:i] + [origin] + pieces[i + 1:], WHITE)
+
+
+class Table():
+    """a generated table on disk; only the probed bytes are read"""
+
+    def __init__(self, path: str):
+        self.file = open(path, "rb")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.data[:len(MAGIC)] != MAGIC:
+            raise ValueError("%s is no tablebase" % path)
+        length = self.data[len(MAGIC)]
+        self.name = self.data[len(MAGIC) + 1:len(MAGIC) + 1 + length].decode()
+        self.kinds = parse_material(self.name)
+        self.offset = len(MAGIC) + 1 + length
+        if len(self.data) - self.offset != table_size(self.kinds):
+            raise ValueError("%s is incomplete" % path)
+
+    def __getitem__(self, index: int) -> int:
+        return self.data[self.offset + index]
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+
+def table_path(directory: str, name: str) -> str:
+    return os.path.join(directory, name + ".cctb")
+
+
+_tables: Dict[str, Table] = {}
+
+
+def _open_table(directory: str, name: str) -> Table:
+    path = table_path(directory, name)
+    if path not in _tables:
+        _tables[path] = Table(path)
+    return _tables[path]
+
+
+def _scan(name: str, directory: str, start: int, stop: int) -> Tuple[bytes, bytes, List[Tuple[int, int]]]:
+    """
+    The first pass over the indices ``start`` to ``stop``: illegal positions, mates and
+    the moves of the lone king, and wins through promotions found in other tables.
+    """
+    kinds = parse_material(name)
+    values = bytearray(stop - start)
+    counters = bytearray(stop - start)
+    seeds = []
+    for index in range(start, stop):
+        king, lone_king, pieces, turn = decode(index, len(kinds))
+        if not _is_legal(kinds, king, lone_king, pieces, turn):
+            values[index - start] = ILLEGAL
+        elif turn == BLACK:
+            targets, capture, in_check = _lone_king_moves(kinds, king, lone_king, pieces)
+            # a capture draws, so the position is never lost
+            counters[index - start] = 255 if capture else len(targets)
+            if not targets and not capture and in_check:
+                seeds.append((0, index))
+        else:
+            for new_kinds, new_pieces in _promotions(kinds, king, lone_king, pieces):
+                value = _open_table(directory, material_name(new_kinds))[encode(king, lone_king, new_pieces, BLACK)]
+                if value != ILLEGAL and value & 1:
+                    seeds.append((value, index))
+    return bytes(values), bytes(counters), seeds
+
+
+def _predecessors(name: str, indices: List[int]) -> List[int]:
+    kinds = parse_material(name)
+    found = []
+    for index in indices:
+        king, lone_king, pieces, turn = decode(index, len(kinds))
+        found.extend(_unmoves(kinds, king, lone_king, pieces, turn))
+    return found
+
+
+def _chunks(items: List[int], count: int) -> List[List[int]]:
+    size = -(-len(items) // count)
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def generate(name: str, directory: str, workers: int = multiprocessing.cpu_count(), log=print) -> str:
+    """builds the table of ``name`` (e.g. "KQK") in ``directory`` and returns its path"""
+    kinds = parse_material(name)
+    name = material_name(kinds)
+    size = table_size(kinds)
+    start = time.perf_counter()
+
+    executor = ProcessPoolExecutor(workers) if workers > 1 else None
+    try:
+        def run(function, *jobs):
+            if executor is None:
+                return [function(*job) for job in zip(*jobs)]
+            return list(executor.map(function, *jobs))
+
+        bounds = list(range(0, size, -(-size // (workers * 8)))) + [size]
+        jobs = len(bounds) - 1
+        values = bytearray()
+        counters = bytearray()
+        levels: Dict[int, List[int]] = {}
+        for part_values, part_counters, seeds in run(_scan, [name] * jobs, [directory] * jobs, bounds[:-1], bounds[1:]):
+            values += part_values
+            counters += part_counters
+            for level, index in seeds:
+                levels.setdefault(level, []).append(index)
+        log("%s: %i positions scanned in %.1fs" % (name, size, time.perf_counter() - start))
+
+        level = longest = 0
+        while levels:
+            candidates = levels.pop(level, [])
+            current = []
+            for index in candidates:
+                if not values[index]:
+                    values[index] = level + 1
+                    current.append(index)
+            if current:
+                longest = level
+                chunks = _chunks(current, workers * 4)
+                for found in run(_predecessors, [name] * len(chunks), chunks):
+                    for index in found:
+                        if values[index]:
+                            continue
+                        if level & 1:
+                            # won for the other side, the lone king loses once all its moves win
+                            counters[index] -= 1
+                            if not counters[index]:
+                                levels.setdefault(level + 1, []).append(index)
+                        else:
+                            levels.setdefault(level + 1, []).append(index)
+            level += 1
+        log("%s: longest mate in %i plies, %.1fs" % (name, longest, time.perf_counter() - start))
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    os.makedirs(directory, exist_ok=True)
+    path = table_path(directory, name)
+    with open(path + ".tmp", "wb") as file:
+        file.write(MAGIC + bytes([len(name)]) + name.encode())
+        file.write(values)
+    os.replace(path + ".tmp", path)
+    return path
+
+
+class Tablebases():
+    """probes positions with a king and pieces against a lone king from the tables in ``directory``"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def probe(self, position: Position) -> Optional[Tuple[int, int]]:
+        """``(WIN, DRAW or LOSS, plies to mate)`` for the player to move or None without a table"""
+        strong = WHITE if position.colors[BLACK] == position.pieces[piece(BLACK, KING)] else BLACK
+        if position.colors[1 - strong] != position.pieces[piece(1 - strong, KING)]:
+            return None
+        squares = [sq for sq in bits(position.colors[strong]) if piece_kind(position.mailbox[sq]) != KING]
+        squares.sort(key=lambda sq: -piece_kind(position.mailbox[sq]))
+        name = material_name(piece_kind(position.mailbox[sq]) for sq in squares)
+        path = table_path(self.directory, name)
+        if path not in _tables and not os.path.exists(path):
+            return None
+        # both colors play the same way, the table has the stronger side as white
+        turn = WHITE if position.turn == strong else BLACK
+        index = encode(position.king_square(strong), position.king_square(1 - strong), squares, turn)
+        value = _open_table(self.directory, name)[index]
+        if value == ILLEGAL:
+            raise ValueError("impossible position")
+        if not value:
+            return DRAW, 0
+        return (LOSS if value & 1 else WIN), value - 1
+
+
+def random_positions(name: str, count: int, seed: int = 0) -> List[Position]:
+    kinds = parse_material(name)
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < count:
+        king, lone_king, pieces, turn = decode(rng.randrange(table_size(kinds)), len(kinds))
+        if not _is_legal(kinds, king, lone_king, pieces, turn):
+            continue
+        strong = rng.choice((WHITE, BLACK))
+        position = Position()
+        position.put(piece(strong, KING), king)
+        position.put(piece(1 - strong, KING), lone_king)
+        for kind, sq in zip(kinds, pieces):
+            position.put(piece(strong, kind), sq)
+        position.turn = strong if turn == WHITE else 1 - strong
+        position.move_count = position.turn
+        positions.append(position)
+    return positions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="generates or probes endgame tablebases")
+    parser.add_argument("command", choices=("generate", "probe"))
+    parser.add_argument("directory")
+    parser.add_argument("material", nargs="*", default=DEFAULT_MATERIAL)
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count())
+    args = parser.parse_args()
+
+    if args.command == "generate":
+        for name in args.material:
+            print("written", generate(name, args.directory, args.workers))
+        return
+
+    tablebases = Tablebases(args.directory)
+    for name in args.material:
+        positions = random_positions(name, 10000)
+        tablebases.probe(positions[0])
+        start = time.perf_counter()
+        results = [tablebases.probe(position) for position in positions]
+        elapsed = time.perf_counter() - start
+        won = sum(1 for result in results if result[0] != DRAW)
+        print("%s: %.2f us per probe, %.0f%% decided, longest %i plies" % (
+            name, elapsed / len(positions) * 1e6, 100 * won / len(results), max(result[1] for result in results)
+        ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,26 @@
+from bitboard import Position
+from book import OpeningBook, build
+from movegen import generate_legal_moves
+from notation import DRAW, WHITE_WINS, Game, game_to_text
+
+
+def test_build_from_text_with_and_without_game_numbers(tmp_path):
+    move = generate_legal_moves(Position.initial())[0]
+    games = tmp_path / "games.txt"
+    games.write_text("\n".join([
+        game_to_text(Game([], DRAW)),
+        game_to_text(Game([move], WHITE_WINS)),
+        "# a comment",
+        "7 " + game_to_text(Game([move], DRAW)),
+        "8 " + game_to_text(Game([], DRAW)),
+    ]) + "\n")
+
+    assert build([str(games)], str(tmp_path / "book")) == 1
+    book = OpeningBook(str(tmp_path / "book"))
+    try:
+        [book_move] = book.lookup(Position.initial())
+        assert book_move.move == move
+        assert book_move.count == 2
+        assert book_move.score == 0.75
+    finally:
+        book.close()
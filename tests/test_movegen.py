@@ -0,0 +1,95 @@
+import random
+
+import pytest
+
+from attackmap import AttackMap
+from bitboard import Position
+from movegen import PERFT_RESULTS, generate_legal_moves, generate_moves, in_check, perft
+
+GAMES = 20
+PLIES = 120
+
+
+def _state(position: Position):
+    return position.mailbox[:], position.pieces[:], position.colors[:], position.occupied, position.key, position.unmoved, position.turn
+
+
+def random_games():
+    """the positions of random games with the move played in each, the same in every run"""
+    rng = random.Random(0)
+    for _ in range(GAMES):
+        position = Position.initial()
+        for _ in range(PLIES):
+            legal = generate_legal_moves(position)
+            if not legal:
+                break
+            move = rng.choice(legal)
+            yield position, move
+            position.make_move(move)
+
+
+@pytest.mark.parametrize("depth", [1, 2, 3])
+def test_perft(depth):
+    assert perft(Position.initial(), depth) == PERFT_RESULTS[depth]
+
+
+def test_unmake_move_restores_the_position():
+    for position, move in random_games():
+        before = _state(position)
+        position.make_move(move)
+        position.unmake_move()
+        assert _state(position) == before
+
+
+def test_unmake_move_takes_back_a_whole_game():
+    rng = random.Random(1)
+    position = Position.initial()
+    states = []
+    for _ in range(PLIES):
+        legal = generate_legal_moves(position)
+        if not legal:
+            break
+        states.append(_state(position))
+        position.make_move(rng.choice(legal))
+    while states:
+        position.unmake_move()
+        assert _state(position) == states.pop()
+
+
+def test_key_is_the_key_computed_from_scratch():
+    for position, _ in random_games():
+        key = position.key
+        fresh = position.copy()
+        fresh.compute_key()
+        assert fresh.key == key
+
+
+def test_incremental_attack_map_equals_a_rebuilt_one():
+    rng = random.Random(2)
+    for _ in range(GAMES):
+        position = Position.initial()
+        attack_map = AttackMap(position)
+        for _ in range(PLIES):
+            legal = generate_legal_moves(position, attack_map)
+            if not legal:
+                break
+            attack_map.make_move(rng.choice(legal))
+            rebuilt = AttackMap(position)
+            assert attack_map.attacks_from == rebuilt.attacks_from
+            assert [attack_map.attacked(color) for color in (0, 1)] == [rebuilt.attacked(color) for color in (0, 1)]
+        while position.history:
+            attack_map.unmake_move()
+            assert attack_map.attacks_from == AttackMap(position).attacks_from
+
+
+def test_legal_moves_are_the_pseudo_legal_moves_not_leaving_the_king_attacked():
+    for position, _ in random_games():
+        us = position.turn
+        expected = []
+        for move in generate_moves(position):
+            position.make_move(move)
+            if not in_check(position, us):
+                expected.append(move)
+            position.unmake_move()
+        assert sorted(generate_legal_moves(position)) == sorted(expected)
+        assert sorted(generate_legal_moves(position, AttackMap(position))) == sorted(expected)
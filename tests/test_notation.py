@@ -0,0 +1,51 @@
+import pytest
+
+from bitboard import SQUARES, Position
+from movegen import generate_legal_moves
+from notation import START_FEN, InvalidGame, from_fen, pack_move, to_fen, unpack_move
+
+
+def test_pack_and_unpack_every_legal_move():
+    position = Position.initial()
+    for move in generate_legal_moves(position):
+        assert unpack_move(position, pack_move(move)) == move
+
+
+@pytest.mark.parametrize("offset", [0, 1, SQUARES, SQUARES * 40])
+def test_out_of_range_codes_are_rejected(offset):
+    # a start of SQUARES or more would shift into the target and could decode as another legal move
+    position = Position.initial()
+    move = generate_legal_moves(position)[0]
+    with pytest.raises(InvalidGame):
+        unpack_move(position, SQUARES * SQUARES + offset + pack_move(move) % SQUARES)
+    with pytest.raises(InvalidGame):
+        unpack_move(position, -1 - offset)
+
+
+def test_fen_round_trip():
+    position = Position.initial()
+    for move in generate_legal_moves(position)[:3]:
+        position.make_move(move)
+    assert to_fen(from_fen(to_fen(position))) == to_fen(position)
+    assert from_fen(START_FEN).key == Position.initial().key
+
+
+def _with_rank(rank: int, row: str) -> str:
+    rows = START_FEN.split()[0].split("/")
+    rows[7 - rank] = row
+    return " ".join(["/".join(rows)] + START_FEN.split()[1:])
+
+
+@pytest.mark.parametrize("fen", [
+    _with_rank(7, "25p"),       # past the last square
+    _with_rank(3, "25p"),       # past the last file
+    _with_rank(3, "24p"),
+    _with_rank(3, "23pp"),
+    _with_rank(3, "23"),
+    _with_rank(7, "p1" + START_FEN.split("/")[0][1:]),  # a missing tile of rank 7
+    START_FEN.replace("k", "q", 1),                      # no white king
+    _with_rank(3, "k23"),                                # two white kings
+])
+def test_invalid_positions_are_rejected(fen):
+    with pytest.raises(ValueError):
+        from_fen(fen)
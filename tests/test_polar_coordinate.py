@@ -0,0 +1,132 @@
+"""``PolarArray`` against ``PolarCoordinate``, one coordinate at a time"""
+import math
+import random
+
+import pygame
+import pytest
+
+from polar_coordinate import FULL_CIRCLE_ANGLE, PolarArray, PolarCoordinate, normalize_angles
+
+# np.arctan2 and math.atan2 may differ in the last bit
+TOLERANCE = dict(rel=1e-12, abs=1e-12)
+
+rng = random.Random(0)
+EDGE_POINTS = [
+    (0, 0), (1, 0), (-1, 0), (0, 1), (0, -1), (5, -0.0), (-5, -0.0), (-5, 0.0),
+    (3, -1e-300), (3, 1e-300), (-3, -1e-300), (1e9, -1), (-7, -7), (7, -7),
+]
+RANDOM_POINTS = [(rng.uniform(-500, 500), rng.uniform(-500, 500)) for _ in range(500)]
+PIXELS = [(rng.randrange(-400, 400), rng.randrange(-300, 300)) for _ in range(500)]
+POINTS = EDGE_POINTS + RANDOM_POINTS + PIXELS
+
+
+def array_of(points) -> PolarArray:
+    return PolarArray.from_cartesian([x for x, _ in points], [y for _, y in points])
+
+
+def assert_same(array: PolarArray, singles):
+    for i, single in enumerate(singles):
+        assert array.r[i] == pytest.approx(single.r, **TOLERANCE)
+        assert array.phi[i] == pytest.approx(single.phi, **TOLERANCE)
+        assert 0 <= array.phi[i] <= FULL_CIRCLE_ANGLE
+
+
+def test_from_cartesian():
+    assert_same(array_of(POINTS), [PolarCoordinate.from_cartesian(x, y) for x, y in POINTS])
+
+
+def test_from_complex():
+    values = [complex(x, y) for x, y in POINTS]
+    assert_same(PolarArray.from_complex(values), [PolarCoordinate.from_complex(value) for value in values])
+
+
+def test_to_cartesian():
+    screen = pygame.Surface((800, 600))
+    xs, ys = array_of(POINTS).to_cartesian(screen)
+    for i, (x, y) in enumerate(POINTS):
+        single = PolarCoordinate.from_cartesian(x, y).to_cartesian(screen)
+        assert (xs[i], ys[i]) == pytest.approx(single, rel=1e-9, abs=1e-6)
+
+
+def test_origin():
+    array = array_of([(0, 0)])
+    assert (array.r[0], array.phi[0]) == (0.0, 0.0)
+
+
+def test_wrap_around():
+    # just below the positive x axis the angle is close to 2pi, not negative
+    array = array_of([(3, -1e-12), (3, -0.0)])
+    assert array.phi[0] == pytest.approx(FULL_CIRCLE_ANGLE)
+    assert array.phi[0] <= FULL_CIRCLE_ANGLE
+    assert array.phi[1] == 0.0
+
+
+@pytest.mark.parametrize("phi", [
+    0.0, -0.0, FULL_CIRCLE_ANGLE, -FULL_CIRCLE_ANGLE, FULL_CIRCLE_ANGLE + 1e-9, -1e-9,
+    math.pi, 3 * math.pi, -5 * math.pi, 100.0, -100.0, 1e-300,
+])
+def test_normalize_angles(phi):
+    # the same arithmetic as the setter, so the same bits
+    assert normalize_angles([phi])[0] == PolarCoordinate(1, phi).phi
+
+
+def test_normalize_random_angles():
+    angles = [rng.uniform(-50, 50) for _ in range(200)]
+    assert normalize_angles(angles).tolist() == [PolarCoordinate(1, phi).phi for phi in angles]
+
+
+def test_negative_radii():
+    radii = [-1.0, -2.5, -1e-9, 0.0, 3.0, -400.0]
+    angles = [0.0, 1.0, math.pi, FULL_CIRCLE_ANGLE - 0.1, -2.0, 7.0]
+    array = PolarArray(radii, angles)
+    assert_same(array, [PolarCoordinate(r, phi) for r, phi in zip(radii, angles)])
+    assert (array.r >= 0).all()
+
+
+def test_add_and_sub():
+    a = RANDOM_POINTS[:100]
+    b = RANDOM_POINTS[100:200]
+    singles_a = [PolarCoordinate.from_cartesian(x, y) for x, y in a]
+    singles_b = [PolarCoordinate.from_cartesian(x, y) for x, y in b]
+    assert_same(array_of(a) + array_of(b), [p + q for p, q in zip(singles_a, singles_b)])
+    assert_same(array_of(a) - array_of(b), [p - q for p, q in zip(singles_a, singles_b)])
+    other = PolarCoordinate(2.0, 1.0)
+    assert_same(array_of(a) + other, [p + other for p in singles_a])
+
+
+def test_mul_and_div():
+    a = RANDOM_POINTS[:100]
+    b = RANDOM_POINTS[100:200]
+    singles_a = [PolarCoordinate.from_cartesian(x, y) for x, y in a]
+    singles_b = [PolarCoordinate.from_cartesian(x, y) for x, y in b]
+    assert_same(array_of(a) * array_of(b), [p * q for p, q in zip(singles_a, singles_b)])
+    assert_same(array_of(a) * -1.5, [p * -1.5 for p in singles_a])
+    assert_same(2 * array_of(a), [2 * p for p in singles_a])
+    assert_same(array_of(a) / 4.0, [p * 0.25 for p in singles_a])
+
+
+def test_to_tiles():
+    main = pytest.importorskip("main")
+    screen = pygame.Surface((800, 600))
+    height = main.tile_height(screen)
+    files, ranks = array_of(POINTS).to_tiles(height, main.BOARD_CENTER_OFFSET)
+    for i, (x, y) in enumerate(POINTS):
+        polar = PolarCoordinate.from_cartesian(x, y)
+        if polar.phi == 0:
+            continue    # file 24 of polar_to_tile, which has no tile either
+        expected = main.polar_to_tile(polar, screen)
+        assert (files[i], ranks[i]) == (expected if expected is not None else (-1, -1))
+
+
+def test_from_tiles():
+    main = pytest.importorskip("main")
+    screen = pygame.Surface((800, 600))
+    tiles = [(file, rank) for file in range(main.TOTAL_FILES) for rank in range(main.RANKS)]
+    array = PolarArray.from_tiles([f for f, _ in tiles], [r for _, r in tiles], main.tile_height(screen), main.BOARD_CENTER_OFFSET)
+    assert_same(array, [main.tile_to_polar(tile, screen) for tile in tiles])
+    # and back to the same tiles
+    array.r += 0.5 * main.tile_height(screen)
+    files, ranks = array.to_tiles(main.tile_height(screen), main.BOARD_CENTER_OFFSET)
+    for i, (file, rank) in enumerate(tiles):
+        expected = (file, rank) if main.does_tile_exist(file, rank) else (-1, -1)
+        assert (files[i], ranks[i]) == expected
@@ -0,0 +1,38 @@
+import asyncio
+import json
+
+import pytest
+
+from server import MAX_LINE, GameServer
+
+
+async def _exchange(lines):
+    """the answers of a fresh server to ``lines`` sent over one connection, ``None`` once it is closed"""
+    game_server = GameServer()
+    server = await asyncio.start_server(game_server.handle, "127.0.0.1", 0, limit=MAX_LINE)
+    port = server.sockets[0].getsockname()[1]
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    answers = []
+    for line in lines:
+        writer.write(line.encode() + b"\n")
+        await writer.drain()
+        answer = await asyncio.wait_for(reader.readline(), 5)
+        answers.append(json.loads(answer) if answer else None)
+    writer.close()
+    server.close()
+    await server.wait_closed()
+    return answers
+
+
+@pytest.mark.parametrize("line", ["[]", "1", '"new"', "null", "not json"])
+def test_bad_messages_get_an_error_and_keep_the_connection(line):
+    error, created = asyncio.run(_exchange([line, '{"type": "new"}']))
+    assert error["type"] == "error"
+    assert created == {"type": "created", "game": 1, "color": "white"}
+
+
+def test_oversized_messages_get_an_error_and_close_the_connection():
+    line = '{"type": "new", "padding": "%s"}' % ("x" * MAX_LINE)
+    error, closed = asyncio.run(_exchange([line, '{"type": "new"}']))
+    assert error["type"] == "error"
+    assert closed is None
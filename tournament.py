@@ -0,0 +1,230 @@
+"""
+Plays engine settings against each other on a process pool, without any display.
+
+    python tournament.py RESULTS GAMES [--a SETTINGS] [--b SETTINGS] [--openings PLIES] [--workers N]
+
+Settings are comma separated, e.g. ``depth=3,nodes=20000,eval=material``. Every
+opening (the initial setup followed by ``PLIES`` random moves, the same for each
+pair of games) is played twice with swapped colors. Finished games are appended to
+``RESULTS`` as they come in; running the same command again continues where an
+interrupted run stopped.
+"""
+import argparse
+import math
+import multiprocessing
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import evaluation
+from bitboard import WHITE, Position
+from engine import PIECE_VALUES, Engine, evaluate
+from movegen import generate_legal_moves, in_check
+from notation import BLACK_WINS, DRAW, WHITE_WINS, Game, game_to_text
+
+MAX_MOVES = 400
+
+
+def material(position: Position) -> int:
+    """material only from the view of the player to move"""
+    score = 0
+    for kind, value in enumerate(PIECE_VALUES):
+        score += value * (position.pieces[kind].bit_count() - position.pieces[6 + kind].bit_count())
+    return score if position.turn == WHITE else -score
+
+
+EVALUATIONS: Dict[str, Callable[[Position], int]] = {
+    "default": evaluate,
+    "material": material,
+    "mobility": evaluation.evaluate,
+}
+
+
+class Settings(NamedTuple):
+    depth: int = 64
+    nodes: Optional[int] = None
+    time: Optional[float] = None
+    eval: str = "default"
+
+    @classmethod
+    def parse(cls, text: str) -> "Settings":
+        settings = cls()
+        for item in filter(None, text.split(",")):
+            name, _, value = item.partition("=")
+            if name not in cls._fields:
+                raise ValueError("unknown setting %r" % name)
+            if name == "eval" and value not in EVALUATIONS:
+                raise ValueError("unknown evaluation %r" % value)
+            settings = settings._replace(**{name: _SETTING_TYPES[name](value)})
+        if settings.nodes is None and settings.time is None and settings.depth == cls().depth:
+            raise ValueError("settings %r have no limit" % text)
+        return settings
+
+    def __str__(self) -> str:
+        return ",".join("%s=%s" % (name, value) for name, value in zip(self._fields, self) if value is not None)
+
+
+_SETTING_TYPES = {"depth": int, "nodes": int, "time": float, "eval": str}
+
+
+class GameResult(NamedTuple):
+    index: int
+    game: Game
+    worker: int
+    seconds: float
+
+
+_engines: List[Engine] = []
+_settings: Tuple[Settings, Settings] = (Settings(), Settings())
+
+
+def _init_worker(a: Settings, b: Settings):
+    global _engines, _settings
+    _settings = (a, b)
+    _engines = [Engine(tt_size_mb=4, evaluate=EVALUATIONS[settings.eval]) for settings in _settings]
+
+
+def opening(index: int, plies: int, seed: int) -> List[int]:
+    """random moves from the initial setup (the setup of ``ChesssBoard``), the same for both games of a pair"""
+    rng = random.Random(seed * 1000003 + index // 2)
+    while True:
+        position = Position.initial()
+        moves = []
+        for _ in range(plies):
+            legal = generate_legal_moves(position)
+            if not legal:
+                break
+            move = rng.choice(legal)
+            position.make_move(move)
+            moves.append(move)
+        else:
+            return moves
+
+
+def play_game(index: int, plies: int, seed: int) -> GameResult:
+    """game ``index`` in a worker; settings ``a`` play white in even games"""
+    start = time.perf_counter()
+    position = Position.initial()
+    moves = opening(index, plies, seed)
+    for move in moves:
+        position.make_move(move)
+    for engine in _engines:
+        engine.tt.clear()
+
+    players = (0, 1) if index % 2 == 0 else (1, 0)
+    result = DRAW
+    while len(moves) < MAX_MOVES:
+        if not generate_legal_moves(position):
+            if in_check(position, position.turn):
+                result = BLACK_WINS if position.turn == WHITE else WHITE_WINS
+            break
+        if position.repetitions() >= 3:
+            break
+        player = players[position.turn]
+        settings = _settings[player]
+        move = _engines[player].search(position, settings.depth, settings.time, settings.nodes).move
+        position.make_move(move)
+        moves.append(move)
+    return GameResult(index, Game(moves, result), os.getpid(), time.perf_counter() - start)
+
+
+def score_of_a(index: int, result: str) -> float:
+    if result == DRAW:
+        return 0.5
+    return float((result == WHITE_WINS) == (index % 2 == 0))
+
+
+def elo(scores: List[float]) -> Tuple[float, float]:
+    """elo difference of ``a`` and the 95% error of it"""
+    n = len(scores)
+    mean = sum(scores) / n
+    deviation = math.sqrt(sum((s - mean) ** 2 for s in scores) / n / n)
+
+    def to_elo(score: float) -> float:
+        score = min(max(score, 1e-3), 1 - 1e-3)
+        return -400 * math.log10(1 / score - 1)
+
+    difference = to_elo(mean)
+    error = (to_elo(mean + 1.96 * deviation) - to_elo(mean - 1.96 * deviation)) / 2
+    return difference, error
+
+
+def load_results(path: str, header: str) -> Dict[int, str]:
+    """finished games of an earlier run; a line cut off by an interruption is dropped"""
+    results: Dict[int, str] = {}
+    if not os.path.exists(path):
+        with open(path, "w") as file:
+            file.write(header + "\n")
+        return results
+
+    with open(path, "r+") as file:
+        lines = file.read().split("\n")
+        if lines[0] != header:
+            raise ValueError("%s was played with other settings: %s" % (path, lines[0]))
+        if lines[-1]:
+            # the last line is incomplete
+            file.seek(sum(len(line) + 1 for line in lines[:-1]))
+            file.truncate()
+        for line in lines[1:-1]:
+            index, _, game = line.split(" ", 2)
+            results[int(index)] = game.split(" ", 1)[0]
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="plays two engine settings against each other")
+    parser.add_argument("results", help="file the games are written to and resumed from")
+    parser.add_argument("games", type=int)
+    parser.add_argument("--a", type=Settings.parse, default=Settings(depth=2))
+    parser.add_argument("--b", type=Settings.parse, default=Settings(depth=2, eval="material"))
+    parser.add_argument("--openings", type=int, default=8, metavar="PLIES", help="random moves before the engines take over, 0 for the initial setup")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count())
+    args = parser.parse_args()
+
+    header = "# a=%s b=%s openings=%i seed=%i" % (args.a, args.b, args.openings, args.seed)
+    try:
+        results = load_results(args.results, header)
+    except ValueError as error:
+        parser.error(str(error))
+    pending = [index for index in range(args.games) if index not in results]
+    print("%i games played, %i to go" % (len(results), len(pending)))
+
+    busy: Dict[int, float] = {}
+    played = 0
+    start = time.perf_counter()
+    with open(args.results, "a") as file, ProcessPoolExecutor(
+        args.workers, initializer=_init_worker, initargs=(args.a, args.b)
+    ) as executor:
+        futures = [executor.submit(play_game, index, args.openings, args.seed) for index in pending]
+        try:
+            for future in as_completed(futures):
+                result = future.result()
+                file.write("%i %s\n" % (result.index, game_to_text(result.game)))
+                file.flush()
+                results[result.index] = result.game.result
+                busy[result.worker] = busy.get(result.worker, 0.0) + result.seconds
+                played += 1
+        except KeyboardInterrupt:
+            for future in futures:
+                future.cancel()
+            print("interrupted, run again to continue")
+    elapsed = time.perf_counter() - start
+
+    scores = [score_of_a(index, result) for index, result in results.items()]
+    if scores:
+        difference, error = elo(scores)
+        print("a: %s\nb: %s" % (args.a, args.b))
+        print("%i games: +%i =%i -%i, elo %+.1f +- %.1f" % (
+            len(scores), scores.count(1.0), scores.count(0.5), scores.count(0.0), difference, error
+        ))
+    if played:
+        print("%.2f games/s" % (played / elapsed))
+        for worker, seconds in sorted(busy.items()):
+            print("worker %i: %.0f%% busy" % (worker, 100 * seconds / elapsed))
+
+
+if __name__ == "__main__":
+    main()
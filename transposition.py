@@ -0,0 +1,82 @@
+from array import array
+from typing import NamedTuple, Optional
+
+# bound of a stored score, 0 marks an empty slot
+EXACT = 1
+LOWER = 2
+UPPER = 3
+
+ENTRY_BYTES = 16
+_SCORE_OFFSET = 1 << 28
+
+
+class Entry(NamedTuple):
+    depth: int
+    score: int
+    bound: int
+    move: int
+
+
+class TranspositionTable():
+    """
+    Fixed size hash table of search results keyed by the zobrist key of a position.
+
+    Each slot is two 64 bit words: the key xor the data, and the data (move, depth,
+    bound, generation and score). A slot whose words don't match (torn write of
+    another process) simply reads as a miss.
+
+    A slot is replaced if it is empty, holds the same position, is left over from an
+    older search or was searched less deep.
+    """
+
+    def __init__(self, size_mb: float = 16, buffer=None):
+        if buffer is not None:
+            words = memoryview(buffer).cast("B").cast("Q")
+        else:
+            entries = 1 << max(int(size_mb * (1 << 20) // ENTRY_BYTES).bit_length() - 1, 0)
+            words = array("Q", bytes(entries * ENTRY_BYTES))
+        self.size = len(words) // 2
+        if self.size & (self.size - 1):
+            raise ValueError("the number of entries must be a power of two")
+        self.words = words
+        self.mask = self.size - 1
+        self.generation = 0
+        self.probes = 0
+        self.hits = 0
+
+    def new_search(self):
+        """entries of previous searches become replaceable"""
+        self.generation = (self.generation + 1) & 0xFF
+
+    def clear(self):
+        raw = memoryview(self.words).cast("B")
+        raw[:] = bytes(len(raw))
+
+    def probe(self, key: int) -> Optional[Entry]:
+        self.probes += 1
+        i = (key & self.mask) << 1
+        data = self.words[i + 1]
+        if not data or self.words[i] ^ data != key:
+            return None
+        self.hits += 1
+        return Entry(data >> 17 & 0xFF, (data >> 35) - _SCORE_OFFSET, data >> 25 & 0x3, data & 0x1FFFF)
+
+    def store(self, key: int, depth: int, score: int, bound: int, move: int):
+        i = (key & self.mask) << 1
+        old = self.words[i + 1]
+        if old and self.words[i] ^ old != key and old >> 27 & 0xFF == self.generation and old >> 17 & 0xFF > depth:
+            return
+        if not move and old and self.words[i] ^ old == key:
+            move = old & 0x1FFFF    # keep the best move of a shallower search
+        data = move | depth << 17 | bound << 25 | self.generation << 27 | (score + _SCORE_OFFSET) << 35
+        self.words[i] = key ^ data
+        self.words[i + 1] = data
+
+    def usage(self) -> float:
+        """share of the first 1000 slots filled in the current search"""
+        sample = min(self.size, 1000)
+        used = sum(
+            1 for i in range(sample)
+            if self.words[2 * i + 1] and self.words[2 * i + 1] >> 27 & 0xFF == self.generation
+        )
+        return used / sample